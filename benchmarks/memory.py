@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# ==== BUILT-IN librariers of Python
+import os, sys, json, random, tracemalloc
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# ==== INTERNAL librariers
+from intlib.inodes import IChkInodeSet
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def measure(build) -> int:
+    tracemalloc.start()
+    try:
+        tracked = build()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    del tracked
+    return size
+
+def pathSet(count):
+    # what traverser kept before - full path of every file and directory
+    return set(f"/srv/backup/host-{i % 97:02d}/daily.{i % 31}/data/dir-{i // 1000:05d}/file-{i:08d}.bin" for i in range(count))
+
+def inodeSet(count):
+    inodes = IChkInodeSet()
+    for ino in random.sample(range(count * 16), count):
+        inodes.add((2049, ino))
+    return inodes
+
+#############################################################################################################
+###### Memory per tracked file benchmark
+#############################################################################################################
+if __name__ == '__main__':
+    argParser = ArgumentParser(description="Memory used by traverser to track one file")
+    argParser.add_argument('-n', '--count', type=int, default=200000, help="Number of tracked entries (default: 200000)")
+    args = argParser.parse_args()
+
+    results = {
+        "count": args.count,
+        "path_set_bytes_per_entry": measure(lambda: pathSet(args.count)) / args.count,
+        "inode_set_bytes_per_entry": measure(lambda: inodeSet(args.count)) / args.count,
+    }
+
+    print(json.dumps(results, indent=2))
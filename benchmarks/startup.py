@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# ==== BUILT-IN librariers of Python
+import os, sys, json, time, tempfile, subprocess
+from argparse import ArgumentParser
+
+# ==== Constants
+ICHK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ichk.py")
+
+# startup budgets in milliseconds of import time (-X importtime) for typical invocations
+BUDGETS = {
+    "version": 50,
+    "hash-one-file": 250,
+}
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def importTime(args) -> tuple:
+    # -X importtime writes "import time: self | cumulative | name" to stderr, top-level modules have no indent
+    startTime = time.perf_counter()
+    result    = subprocess.run([sys.executable, "-X", "importtime", ICHK_PATH] + args,
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wallTime  = time.perf_counter() - startTime
+
+    totalUs = 0
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            totalUs += int(cumulative)
+            modules[name.strip()] = int(cumulative)
+
+    return totalUs / 1000, wallTime * 1000, modules
+
+def measure(args, runs) -> dict:
+    samples = [importTime(args) for _ in range(runs)]
+    best    = min(samples, key=lambda sample: sample[0])
+
+    return {
+        "import_ms": round(best[0], 1),
+        "wall_ms": round(min(sample[1] for sample in samples), 1),
+        "top_imports_ms": {name: round(us / 1000, 1) for name, us in sorted(best[2].items(), key=lambda item: -item[1])[:5]},
+    }
+
+#############################################################################################################
+###### Startup time benchmark
+#############################################################################################################
+if __name__ == '__main__':
+    argParser = ArgumentParser(description="Measure ichk startup (import) time and check it against budget")
+    argParser.add_argument('-n', '--runs', type=int, default=5, help="Runs per case, the best one is used (default: 5)")
+    argParser.add_argument('--no-budget', action='store_true', help="Only report, don't fail when budget is exceeded")
+    args = argParser.parse_args()
+
+    with tempfile.NamedTemporaryFile() as sample:
+        sample.write(b"ichk startup benchmark\n")
+        sample.flush()
+
+        cases = {
+            "version": ["-V"],
+            "hash-one-file": ["--format", "jsonl", sample.name],
+        }
+        results = {name: measure(caseArgs, args.runs) | {"budget_ms": BUDGETS[name]} for name, caseArgs in cases.items()}
+
+    print(json.dumps(results, indent=2))
+
+    overBudget = [name for name, result in results.items() if result["import_ms"] > result["budget_ms"]]
+    if overBudget and not args.no_budget:
+        print(f"Startup budget exceeded: {', '.join(overBudget)}", file=sys.stderr)
+        exit(1)
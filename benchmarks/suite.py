@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# ==== BUILT-IN librariers of Python
+import os, sys, json, time, shutil, platform, tempfile, subprocess
+from argparse import ArgumentParser
+
+# ==== Constants
+ICHK_PATH  = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ichk.py")
+MB         = 1000 * 1000
+
+# synthetic trees - small enough to run in a minute on tmpfs, --scale multiplies counts
+TREES = {
+    "tiny-files": {"files": 20000, "size": 64},
+    "huge-sparse": {"files": 4, "size": 256 * MB, "sparse": True},
+    "deep-dirs": {"files": 2000, "size": 4096, "depth": 64},
+    "hardlink-farm": {"files": 1000, "size": 65536, "links": 8},
+}
+
+# runs of ichk measured on every tree
+RUNS = {
+    "scan": ["-s"],
+    "verify": ["-v"],
+    "get-xattr": ["-g"],
+}
+
+# child wrapper - reports counters of ichk process itself when it exits
+RUNNER = """
+import os, sys, json, atexit, resource, runpy
+
+def report():
+    counters = {"maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    try:
+        with open("/proc/self/io") as f:
+            counters |= {name: int(value) for name, value in (line.split(":") for line in f)}
+    except OSError:
+        pass
+    with open(os.environ["ICHK_BENCH_COUNTERS"], "w") as f:
+        json.dump(counters, f)
+
+atexit.register(report)
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def defaultRoot():
+    # tmpfs keeps results independent of disk, it supports user xattrs since Linux 6.6
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+def makeTree(root, name, spec, scale):
+    treePath = os.path.join(root, name)
+    files    = max(1, int(spec["files"] * scale))
+    payload  = os.urandom(min(spec["size"], MB))
+    total    = 0
+
+    for fileNo in range(files):
+        dirPath = treePath
+        if spec.get("depth"):
+            # every file in its own chain of directories
+            dirPath = os.path.join(treePath, *[f"d{level}" for level in range(fileNo % spec["depth"])], f"f{fileNo}")
+        elif files > 1000:
+            dirPath = os.path.join(treePath, f"{fileNo // 1000:04d}")
+        os.makedirs(dirPath, exist_ok=True)
+
+        filePath = os.path.join(dirPath, f"file-{fileNo:07d}.bin")
+        with open(filePath, "wb") as f:
+            if spec.get("sparse"):
+                # data only at head and tail, the rest is hole
+                f.write(payload)
+                f.truncate(spec["size"])
+                f.seek(spec["size"] - len(payload))
+                f.write(payload)
+            else:
+                f.write((payload * (spec["size"] // len(payload) + 1))[:spec["size"]])
+        total += spec["size"]
+
+        for linkNo in range(spec.get("links", 1) - 1):
+            linkDir = os.path.join(treePath, f"links-{linkNo}")
+            os.makedirs(linkDir, exist_ok=True)
+            os.link(filePath, os.path.join(linkDir, f"file-{fileNo:07d}.bin"))
+
+    return treePath, files * spec.get("links", 1), total * spec.get("links", 1)
+
+def dropCaches():
+    # only root can do it - page cache makes warm numbers otherwise
+    try:
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return True
+    except OSError:
+        return False
+
+def runIChk(args, strace=False) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json") as counters:
+        command = [sys.executable, "-c", RUNNER, ICHK_PATH, "--format", "jsonl", "-Q"] + args
+        if strace:
+            command = ["strace", "-f", "-c", "-o", counters.name + ".strace"] + command
+
+        startTime = time.perf_counter()
+        subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, check=True,
+                       env=os.environ | {"ICHK_BENCH_COUNTERS": counters.name})
+        result = {"seconds": time.perf_counter() - startTime}
+
+        with open(counters.name) as f:
+            result |= json.load(f)
+
+        if strace:
+            with open(counters.name + ".strace") as f:
+                totalLine = [line for line in f if line.strip().endswith("total")]
+            result["syscalls"] = int(totalLine[0].split()[2]) if totalLine else None
+            os.unlink(counters.name + ".strace")
+
+    return result
+
+def measure(treePath, files, totalBytes, args, repeat, strace, cold) -> dict:
+    samples = []
+    for _ in range(repeat):
+        if cold:
+            dropCaches()
+        samples.append(runIChk(args + ["-r", treePath], strace))
+
+    # the fastest run is the least disturbed one
+    best    = min(samples, key=lambda sample: sample["seconds"])
+    syscall = best.get("syscalls") or (best.get("syscr", 0) + best.get("syscw", 0)) or None
+
+    return {
+        "seconds": round(best["seconds"], 4),
+        "files_per_s": round(files / best["seconds"], 1),
+        "mb_per_s": round(totalBytes / MB / best["seconds"], 3),
+        "syscalls_per_file": round(syscall / files, 2) if syscall else None,
+        "syscalls_source": "strace" if best.get("syscalls") else "read/write (/proc/self/io)",
+        "read_bytes": best.get("read_bytes"),
+        "peak_rss_kb": best["maxrss_kb"],
+    }
+
+def compare(results, baseline, tolerance) -> list:
+    # lower is worse for throughput, higher is worse for syscalls and memory
+    metrics     = {"files_per_s": 1, "mb_per_s": 1, "syscalls_per_file": -1, "peak_rss_kb": -1}
+    regressions = []
+
+    for key, result in results["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if not base:
+            continue
+
+        for metric, direction in metrics.items():
+            if not result.get(metric) or not base.get(metric):
+                continue
+
+            change = (result[metric] - base[metric]) / base[metric] * 100
+            mark   = ""
+            if change * direction < -tolerance:
+                regressions.append(f"{key} {metric}")
+                mark = " <- REGRESSION"
+            print(f"{key:<28} {metric:<18} {base[metric]:>14} -> {result[metric]:>14} ({change:+6.1f}%){mark}", file=sys.stderr)
+
+    return regressions
+
+#############################################################################################################
+###### Benchmark suite
+#############################################################################################################
+if __name__ == '__main__':
+    argParser = ArgumentParser(description="Benchmark ichk scan, verify and get-xattr runs on synthetic trees")
+    argParser.add_argument('--root', type=str, default=defaultRoot(), help="Directory for synthetic trees, e.g. tmpfs or mounted loopback ext4 image (default: /dev/shm)")
+    argParser.add_argument('--tree', type=str, action='append', choices=list(TREES), help="Run only given tree (can be used multiple times)")
+    argParser.add_argument('--run', type=str, action='append', choices=list(RUNS), help="Run only given ichk run (can be used multiple times)")
+    argParser.add_argument('--scale', type=float, default=1.0, help="Multiply number of files in trees (default: 1.0)")
+    argParser.add_argument('--repeat', type=int, default=3, help="Repeats of every run, the fastest is used (default: 3)")
+    argParser.add_argument('--cold', action='store_true', help="Drop page cache before every run (root only)")
+    argParser.add_argument('--strace', action='store_true', help="Count all syscalls with strace -c (default: read/write syscalls from /proc/self/io)")
+    argParser.add_argument('--ichk-args', type=str, default="", help="Extra arguments passed to every ichk run, e.g. '-j 4 --tree-hash'")
+    argParser.add_argument('-o', '--output', type=str, help="Write results JSON to file (default: stdout)")
+    argParser.add_argument('--baseline', type=str, help="Compare results with JSON written by earlier run")
+    argParser.add_argument('--tolerance', type=float, default=10.0, help="Allowed regression against baseline in percent (default: 10)")
+    argParser.add_argument('--keep', action='store_true', help="Don't remove synthetic trees")
+    args = argParser.parse_args()
+
+    if args.strace and not shutil.which("strace"):
+        print("ERROR: --strace needs strace installed.", file=sys.stderr)
+        exit(128)
+
+    workDir = tempfile.mkdtemp(prefix="ichk-bench-", dir=args.root)
+    results = {
+        "meta": {
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "root": args.root, "scale": args.scale, "repeat": args.repeat, "cold": args.cold,
+            "ichk_args": args.ichk_args, "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": {},
+    }
+
+    try:
+        for treeName in args.tree or TREES:
+            treePath, files, totalBytes = makeTree(workDir, treeName, TREES[treeName], args.scale)
+
+            # scan first - verify and get-xattr need stored hashes
+            for runName in [runName for runName in RUNS if not args.run or runName in args.run or runName == "scan"]:
+                result = measure(treePath, files, totalBytes, RUNS[runName] + args.ichk_args.split(), args.repeat, args.strace, args.cold)
+                if args.run and runName not in args.run:
+                    continue
+
+                results["results"][f"{treeName}/{runName}"] = result | {"files": files, "bytes": totalBytes}
+                print(f"{treeName:<14} {runName:<10} {result['files_per_s']:>10} files/s {result['mb_per_s']:>9} MB/s "
+                      f"{result['peak_rss_kb']:>8} KiB RSS", file=sys.stderr)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workDir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+        if regressions:
+            print(f"Regressions over {args.tolerance}%: {', '.join(regressions)}", file=sys.stderr)
+            exit(1)
@@ -2,31 +2,78 @@
 # ==== BUILT-IN librariers of Python
 import os, sys, signal
 
-# ==== EXTERNAL librariers installed by PyPI
-import trio
-import xxhash
-
 # ==== INTERNAL librariers
+# heavy libraries (trio, rich, dateparser) are imported only when they are needed - see importRuntime()
 from intlib.common    import SIGINT_handler
 from intlib.args      import IChkArgumentParser
-from intlib.traverser import IChkGlobTraverser
-from intlib.hash      import IChkFileHash, IChkFileHashProgress
 
 ICHK_VER = "0.2.1"
 
+def importRuntime():
+    global trio, IChkScandirTraverser, IChkFileHash, IChkFileHashProgress, IChkDeviceScheduler, IChkBudgetScheduler
+    global openStore, openJournal, openReport, openOutput, openMetrics
+
+    import trio
+    from intlib.traverser import IChkScandirTraverser
+    from intlib.hash      import IChkFileHash, IChkFileHashProgress
+    from intlib.scheduler import IChkDeviceScheduler, IChkBudgetScheduler
+    from intlib.store     import openStore
+    from intlib.journal   import openJournal
+    from intlib.report    import openReport
+    from intlib.output    import openOutput
+    from intlib.metrics   import openMetrics
+
 async def main():
-    with IChkFileHashProgress(arguments.args.progress, arguments.args.cronicle) as hashProgress:
-        fileTraverse = IChkGlobTraverser(hashProgress)
-        fileHasher   = IChkFileHash(arguments, hashProgress)
+    with openOutput(arguments.args) as output, \
+         openReport(arguments.args) as report, \
+         openMetrics(arguments.args) as metrics, \
+         IChkFileHashProgress(arguments.args.progress, arguments.args.cronicle, arguments.args.jobs or 1) as hashProgress, \
+         openStore(arguments.args) as store, \
+         openJournal(arguments.args) as journal:
+        # --watch => files come from inotify events instead of walking the tree
+        if arguments.args.watch:
+            from intlib.watcher import IChkInotifyWatcher
+            fileTraverse = IChkInotifyWatcher(arguments, hashProgress)
+        else:
+            fileTraverse = IChkScandirTraverser(arguments, hashProgress, store)
+
+        fileHasher   = IChkFileHash(arguments, hashProgress, store, journal, report, output, metrics)
+        fileBudget   = None
+        fileChannel  = fileTraverse.receiveChannel
+
+        async with trio.open_nursery() as progressNursery:
+            # progress is sampled by separate task, workers only bump counters
+            progressNursery.start_soon(hashProgress.renderer)
+
+            # --metrics/--metrics-prom => periodic export during long runs
+            if metrics:
+                progressNursery.start_soon(metrics.exporter)
+
+            async with trio.open_nursery() as nursery:
+                nursery.start_soon(fileTraverse.traverse, arguments.args.inputFiles, arguments.args.recursive)
+
+                # --budget-time/--budget-bytes => the oldest verified files first until budget is used
+                if arguments.args.budget_time is not None or arguments.args.budget_bytes is not None:
+                    fileBudget  = IChkBudgetScheduler(arguments, hashProgress, store)
+                    fileChannel = fileBudget.receiveChannel
+                    nursery.start_soon(fileBudget.traverse, fileTraverse.receiveChannel)
 
-        async with trio.open_nursery() as nursery:
-            nursery.start_soon(fileTraverse.traverse, arguments.args.inputFiles, arguments.args.recursive)
-            nursery.start_soon(fileHasher.traverse, fileTraverse.queue)
+                if arguments.args.device_lanes:
+                    nursery.start_soon(IChkDeviceScheduler(arguments, fileHasher).traverse, fileChannel)
+                else:
+                    nursery.start_soon(fileHasher.traverse, fileChannel)
+
+            progressNursery.cancel_scope.cancel()
+
+        fileHasher.printSummary()
+        if fileBudget:
+            fileBudget.printSummary()
             
 
 if __name__ == '__main__':
     arguments = IChkArgumentParser(sys.argv[1:])
     if arguments.args.version:
+        import xxhash
         print(f"ICHK v{ICHK_VER}")
         print(f"XXHASH v{xxhash.XXHASH_VERSION}")
         exit(0)
@@ -38,12 +85,55 @@ if __name__ == '__main__':
         exit(128)
     arguments.args.lock_file = arguments.args.lock_file or arguments.args.immutable
 
+    if arguments.args.resume and not arguments.args.journal:
+        print("ERROR: --resume needs journal file set with --journal.")
+        exit(128)
+
+    if arguments.args.catalog_due and not arguments.args.catalog:
+        print("ERROR: --catalog-due needs catalog file set with --catalog.")
+        exit(128)
+
+    if arguments.args.scrub is not None and (arguments.args.scrub < 1 or not arguments.args.verify_xattr):
+        print("ERROR: --scrub needs positive number of runs and --verify-xattr.")
+        exit(128)
+
+    # chunk hashes don't fit into xattrs - without catalog or chunk store only the root hash is kept
+    if arguments.args.scrub is not None and not (arguments.args.catalog or arguments.args.chunk_store):
+        print("ERROR: --scrub needs chunk hashes kept in --catalog or --chunk-store.")
+        exit(128)
+
+    if arguments.args.tree_hash and not (arguments.args.catalog or arguments.args.chunk_store):
+        print("WARNING: --tree-hash without --catalog or --chunk-store keeps only the root hash, corrupted chunks can't be located.", file=sys.stderr)
+
+    if arguments.args.watch and (arguments.args.inputFiles is sys.stdin or not arguments.args.inputFiles or sys.platform != "linux"):
+        print("ERROR: --watch needs directories given as arguments and works only on Linux.")
+        exit(128)
+
+    if arguments.args.watch and (arguments.args.catalog_due or arguments.args.budget_time is not None or arguments.args.budget_bytes is not None):
+        print("ERROR: --watch can't be used with --catalog-due, --budget-time or --budget-bytes.")
+        exit(128)
+
+    if arguments.args.format == "xxhsum" and arguments.args.tree_hash:
+        print("ERROR: --format xxhsum needs XXH128 of whole files and can't be used with --tree-hash.")
+        exit(128)
+
+    if arguments.args.digest and arguments.args.tree_hash:
+        print("ERROR: --digest needs whole file read in order and can't be used with --tree-hash.")
+        exit(128)
+
+    if arguments.args.adaptive_io and not (arguments.args.rate_limit or arguments.args.device_rate_limit):
+        print("ERROR: --adaptive-io needs upper limit set with --rate-limit or --device-rate-limit.")
+        exit(128)
+
     if arguments.args.rate_limit:
         print(f"WARNING: rate limiter enabled to {arguments.args.rate_limit}MB/s\n")
+    if arguments.args.device_rate_limit:
+        print(f"WARNING: per device rate limiter enabled to {arguments.args.device_rate_limit}MB/s\n")
 
     handler  = SIGINT_handler()
     signal.signal(signal.SIGINT, handler.signal_handler)
 
+    importRuntime()
     trio.run(main)
 
     if handler.SIGINT: exit(130)
\ No newline at end of file
@@ -2,6 +2,8 @@
 import sys
 from argparse import ArgumentParser, SUPPRESS
 
+# ==== INTERNAL librariers
+from .common import HumanBytes, parseDuration
 
 
 #############################################################################################################
@@ -37,21 +39,56 @@ class IChkArgumentParser():
         argParser = ArgumentParser()
         argParser.add_argument('inputFiles', type=str, nargs='*', default=sys.stdin, help="Input files list - if empty, provide list thru stdin", metavar='filename')
         argParser.add_argument('-r', '--recursive',  action='store_true', help="Process folders recursively")
+        argParser.add_argument('-x', '--one-file-system', action='store_true', help="Don't descend into directories on other file systems")
+        argParser.add_argument('--watch', action='store_true', help="Keep running and process files in given directories when they are written or moved in (inotify, Linux only)")
+        argParser.add_argument('--watch-debounce', type=parseDuration, default=2, help="Process file only after no new events came for it for given time (default: 2s)", metavar='TIME')
+        argParser.add_argument('--watch-rescan', type=parseDuration, default=300, help="Time between rescans of directories over inotify watch limit (default: 5m)", metavar='TIME')
+        argParser.add_argument('--include', type=str, action='append', help="Process only files matching pattern (can be used multiple times)", metavar='PATTERN')
+        argParser.add_argument('--exclude', type=str, action='append', help="Skip files and folders matching pattern (can be used multiple times)", metavar='PATTERN')
         
         argParser.add_argument('-c', '--calculate', action='store_true', help="Calculate hashes for new files")
         argParser.add_argument('-g', '--get-xattr', action='store_true', help="Get 'user.ichk.*' extended attributes for file and print to stdout")
         argParser.add_argument('-s', '--set-xattr', action='store_true', help="Set 'user.ichk.*' extended attributes for file with calculated checksum")
         argParser.add_argument('-v', '--verify-xattr', action='store_true', help="Verify calculated checksum with file extended attributes")
+        argParser.add_argument('--verify-depth', type=str, choices=["stat", "oshash", "full"], default="full", help="How deep verification goes: stat (size, inode and mtime only), oshash (also file head and tail) or full (default: full)")
+        argParser.add_argument('--scrub', type=int, help="With --verify-xattr check only every N-th chunk of --tree-hash files, rotating so N runs cover whole file; progress is kept in 'user.ichk.scrub'", metavar='N')
         argParser.add_argument('--verify-older-than', type=str, help="Verify calculated checksum with files verified more tan specified time (you can use human date repr like '1 day')")
+        argParser.add_argument('--catalog', type=str, help="Store 'ichk.*' attributes in SQLite catalog file instead of file extended attributes", metavar='FILE')
+        argParser.add_argument('--budget-time', type=parseDuration, help="Process oldest verified files first and stop starting new ones after given time (e.g. '4h', '1h30m')", metavar='TIME')
+        argParser.add_argument('--budget-bytes', type=HumanBytes.parse, help="Process oldest verified files first and stop after reading given amount of data (e.g. '10T', '500G')", metavar='SIZE')
+        argParser.add_argument('--catalog-due', action='store_true', help="Take files from catalog (due to --verify-older-than) instead of traversing input files; input files limit it to given paths")
+        argParser.add_argument('--journal', type=str, help="Write processed files to journal file, so interrupted run can be resumed", metavar='FILE')
+        argParser.add_argument('--resume', action='store_true', help="Skip files already processed according to --journal file and continue it")
         argParser.add_argument('-l', '--lock-file', action='store_true', help="Lock file to read-only. Set also immutable bit if run also as a root user")
         argParser.add_argument('-i', '--immutable', action='store_true', help="Lock file to read-only and immutable. If not run as root it will return error")
-        argParser.add_argument('--rate-limit', type=float, help="Limit read data rate to specified speed in MB/s")
-
+        argParser.add_argument('--rate-limit', type=float, help="Limit read data rate of all files and threads together to specified speed in MB/s")
+        argParser.add_argument('--device-rate-limit', type=float, help="Limit read data rate of every block device to specified speed in MB/s", metavar='RATE_LIMIT')
+        argParser.add_argument('--rate-burst', type=float, help="Amount of data in MB which can be read at once over rate limit (default: quarter of second at rate limit)", metavar='MB')
+        argParser.add_argument('--adaptive-io', action='store_true', help="Slow down rate limit when other processes wait for disk and speed up back when they don't (system wide /proc/pressure/io without own read waits, or --io-pressure)")
+        argParser.add_argument('--io-pressure', type=str, help="PSI file watched by --adaptive-io instead of /proc/pressure/io, e.g. io.pressure of cgroup with the workload to protect (ichk must not run in it)", metavar='FILE')
+        argParser.add_argument('--drop-cache', action='store_true', help="Don't pollute page cache - drop already hashed file data from it (posix_fadvise)")
+        argParser.add_argument('--direct-io', action='store_true', help="Read files for XXH128 with O_DIRECT, bypassing page cache (falls back to buffered reads if not supported)")
+        argParser.add_argument('--tree-hash', action='store_true', help="Hash fixed size chunks in parallel and store root of chunk hashes as 'user.ichk.xxh128tree'")
+        argParser.add_argument('--chunk-size', type=float, default=64, help="Chunk size in MiB for --tree-hash (default: 64)", metavar='MIB')
+        argParser.add_argument('--tree-threads', type=int, help="Number of threads hashing chunks for --tree-hash (default: number of CPUs)", metavar='N')
+        argParser.add_argument('--digest', type=str, action='append', choices=["xxh3_64", "blake2b", "sha256"], help="Calculate also given digest in the same read pass and store it in 'user.ichk.<digest>' (can be used multiple times)")
+        argParser.add_argument('--chunk-store', type=str, help="Directory for per chunk hashes of --tree-hash when catalog is not used", metavar='DIR')
+        argParser.add_argument('--buffer-size', type=float, help="Read buffer size in MiB (default: 1 MiB, 4 MiB for files over 64 MiB, 16 MiB for files over 1 GiB)", metavar='MIB')
+        argParser.add_argument('-j', '--jobs', type=int, help="Number of files processed concurrently (default: 1, with --device-lanes no global limit)", metavar='N')
+        argParser.add_argument('--device-lanes', action='store_true', help="Schedule files in separate lanes per block device, so every disk is read in parallel")
+        argParser.add_argument('--hdd-jobs', type=int, default=1, help="Number of files read concurrently from one rotational or unknown device (btrfs/ZFS, network) with --device-lanes (default: 1)", metavar='N')
+        argParser.add_argument('--ssd-jobs', type=int, default=8, help="Number of files read concurrently from one non-rotational block device with --device-lanes (default: 8)", metavar='N')
+
+        argParser.add_argument('--format', type=str, choices=["jsonl", "csv", "xxhsum"], help="Write results to stdout as JSON Lines, CSV or xxhsum checksum file (XXH128) with full file paths")
         argParser.add_argument('-q', '--quiet', action='store_true', help="Quiet mode - don't print calculated hashes")
         argParser.add_argument('-Q', '--no-stats', action='store_true', help="Don't print performance data")
         argParser.add_argument('-H', '--no-header', action='store_true', help="Don't print header")
         argParser.add_argument('-E', '--no-ellipsis', action='store_true', help="Don't shrink file path and name to fit in terminal window. This is automatically enabled for non color output.")
         argParser.add_argument('-p', '--progress', action='store_true', help="Show progress bar")
+        argParser.add_argument('--report', type=str, help="Stream processed files to JSON Lines file, with aggregated stats on the last line", metavar='FILE')
+        argParser.add_argument('--metrics', type=str, help="Write latency histograms of processing phases per device to JSON file, periodically and at the end", metavar='FILE')
+        argParser.add_argument('--metrics-prom', type=str, help="Write latency histograms of processing phases per device to Prometheus textfile collector file", metavar='FILE')
+        argParser.add_argument('--metrics-interval', type=parseDuration, default=60, help="Time between periodic exports of --metrics/--metrics-prom (default: 60s)", metavar='TIME')
         argParser.add_argument('--cronicle', action='store_true', help="Show progress and status for cronicle/cronicle-edge")
         argParser.add_argument('--color',        dest='color_always', action='store_true', help='when to use terminal colours (none | =always, =auto [default], =never)')
         argParser.add_argument('--color=always', dest='color_always', action='store_true', help=SUPPRESS)
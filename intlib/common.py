@@ -1,5 +1,5 @@
 # ==== BUILT-IN librariers of Python
-import os, sys
+import os, sys, re
 from typing import List, Union
 
 ###################################################################################################################################
@@ -29,6 +29,22 @@ def formatFileName(fileName, maxLen, noEllipsis=False, colour=False):
     else:
         return filePath + fileBase
 
+def parseDuration(text) -> float:
+    # "4h", "1h30m", "90m", "45s", "2d" or plain seconds
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+    text  = text.strip().lower()
+
+    try:
+        return float(text)
+    except ValueError:
+        pass
+
+    parts = re.findall(r"(\d+(?:\.\d+)?)\s*([smhdw])", text)
+    if not parts or re.sub(r"\d+(?:\.\d+)?\s*[smhdw]\s*", "", text):
+        raise ValueError(f"invalid duration: {text}")
+
+    return sum(float(value) * units[unit] for value, unit in parts)
+
 
 ###################################################################################################################################
 ###### Singleton meta-class helper
@@ -98,3 +114,13 @@ class HumanBytes:
                 num /= unit_step
 
         return HumanBytes.PRECISION_FORMATS[precision].format("-" if is_negative else "", num, unit)
+
+    @staticmethod
+    def parse(text: str) -> int:
+        # "10T", "500G", "1.5TiB", "200MB" or plain bytes - binary units like in format()
+        match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmgtpezy]?)(?:i?b)?\s*", text, re.IGNORECASE)
+        if not match:
+            raise ValueError(f"invalid size: {text}")
+
+        power = HumanBytes.CUSTOM_LABELS.index(match.group(2).lower() if match.group(2).lower() == "k" else match.group(2).upper())
+        return int(float(match.group(1)) * 1024 ** power)
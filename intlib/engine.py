@@ -0,0 +1,389 @@
+# ==== BUILT-IN librariers of Python
+import os, errno, mmap, time, hashlib, threading
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# ==== EXTERNAL librariers installed by PyPI
+import xxhash
+import trio
+
+# ==== INTERNAL librariers
+from .common import SIGINT_handler
+
+# ==== Constants
+MIB                  = 1024 * 1024
+DIRECT_IO_ALIGN      = 4096         # O_DIRECT buffer, offset and length alignment
+READ_AHEAD_BUFFERS   = 3            # one hashed, one read and one spare
+PROGRESS_BATCH_TIME  = 0.1          # max delay of tree hash chunks progress
+PARALLEL_DIGEST_SIZE = 64 * 1024    # smaller buffers are hashed inline - thread hop costs more
+
+# --digest => extra digests computed in the same read pass as XXH128, all of them release GIL
+DIGESTS = {
+    "xxh3_64": xxhash.xxh3_64,
+    "blake2b": hashlib.blake2b,
+    "sha256": hashlib.sha256,
+}
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def fadvise(fd, offset, length, advice) -> int:
+    # posix_fadvise is only a hint - not supported platforms and file systems are silently ignored
+    if not hasattr(os, "posix_fadvise"):
+        return 0
+
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        return 0
+
+    return length
+
+def chunksCountOf(fileSize, chunkSize) -> int:
+    # empty file has one empty chunk
+    return max(1, -(-fileSize // chunkSize))
+
+def chunkLength(fileSize, chunkSize, chunkNo) -> int:
+    return max(0, min(chunkSize, fileSize - chunkNo * chunkSize))
+
+def setDirectIO(fd, enabled):
+    import fcntl
+
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    flags = (flags | os.O_DIRECT) if enabled else (flags & ~os.O_DIRECT)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags)
+
+#############################################################################################################
+###### Internal class for providing file hashing in worker thread with read-ahead
+#############################################################################################################
+class IChkHashEngine():
+
+    def __init__(self, progress, bufferSize=None, limiter=None, dropCache=False, directIO=False, treeThreads=None, metrics=None, digests=None) -> None:
+        self.p            = progress
+        self.metrics      = metrics
+        self.digests      = list(dict.fromkeys(digests or []))
+        self.digestPool   = None
+        self.bufferSize   = int(bufferSize * MIB) if bufferSize else None
+        self.limiter      = limiter
+        self.dropCache    = dropCache and hasattr(os, "posix_fadvise")
+        self.directIO     = directIO and hasattr(os, "O_DIRECT")
+        self.droppedBytes = 0
+
+        # chunks of all files hashed by tree hash share one pool
+        self.treeThreads  = treeThreads or os.cpu_count() or 1
+        self.treePool     = None
+
+    # .................................................................
+
+    def blockSize(self, fileSize) -> int:
+        if self.bufferSize:
+            return self.bufferSize
+
+        # bigger blocks for big files - less thread switches per MiB
+        if fileSize < 64 * MIB:
+            return 1 * MIB
+        if fileSize < 1024 * MIB:
+            return 4 * MIB
+        return 16 * MIB
+
+    # .................................................................
+
+    def __open(self, fd):
+        # descriptor is shared with file session - read from the beginning, don't close it
+        f = open(fd, 'rb', buffering=0, closefd=False)
+        f.seek(0)
+
+        if self.directIO:
+            try:
+                setDirectIO(fd, True)
+                return f, True
+            except OSError as e:
+                # file system doesn't support O_DIRECT (tmpfs...) - use buffered reads
+                if e.errno != errno.EINVAL:
+                    raise
+
+        return f, False
+
+    def __allocate(self, size, direct):
+        if direct:
+            # anonymous mmap is always page aligned, length has to be aligned too
+            return mmap.mmap(-1, -(-size // DIRECT_IO_ALIGN) * DIRECT_IO_ALIGN)
+
+        return bytearray(size)
+
+    def __readinto(self, f, buffer, direct):
+        try:
+            return f.readinto(buffer)
+        except OSError as e:
+            if not direct or e.errno != errno.EINVAL:
+                raise
+
+            # unaligned tail of file - finish it without O_DIRECT
+            setDirectIO(f.fileno(), False)
+            return f.readinto(buffer)
+
+    # .................................................................
+
+    def __throttle(self, bytesRead, dev, readTime=0):
+        # --rate-limit => one token bucket shared by all files, threads and read paths
+        if self.limiter:
+            self.limiter.acquire(bytesRead, dev, readTime)
+
+    def __reader(self, f, direct, dev, freeBuffers, filledBuffers, stats):
+        offset = 0
+
+        try:
+            while True:
+                buffer = freeBuffers.get()
+                if buffer is None:
+                    return
+
+                readStartTime = time.time()
+                bytesRead     = self.__readinto(f, buffer, direct)
+                readTime      = time.time() - readStartTime
+                stats['read'] += readTime
+
+                self.__throttle(bytesRead, dev, readTime)
+                filledBuffers.put((buffer, bytesRead))
+                if not bytesRead:
+                    return
+
+                # ask kernel for the next block while this one is hashed
+                offset += bytesRead
+                if self.dropCache:
+                    fadvise(f.fileno(), offset, len(buffer), os.POSIX_FADV_WILLNEED)
+        except Exception as e:
+            filledBuffers.put((e, None))
+
+    def __blocks(self, f, direct, dev, fileSize, stats):
+        blockSize = self.blockSize(fileSize)
+        if direct:
+            blockSize = -(-blockSize // DIRECT_IO_ALIGN) * DIRECT_IO_ALIGN
+
+        # whole file fits in one block - read-ahead thread is not worth starting
+        if fileSize < blockSize:
+            buffer = self.__allocate(max(fileSize, 1), direct)
+            while True:
+                readStartTime = time.time()
+                bytesRead     = self.__readinto(f, buffer, direct)
+                readTime      = time.time() - readStartTime
+                stats['read'] += readTime
+                if not bytesRead:
+                    return
+                self.__throttle(bytesRead, dev, readTime)
+                yield buffer, bytesRead
+
+        freeBuffers   = Queue()
+        filledBuffers = Queue()
+        for _ in range(READ_AHEAD_BUFFERS):
+            freeBuffers.put(self.__allocate(blockSize, direct))
+
+        reader = threading.Thread(target=self.__reader, args=(f, direct, dev, freeBuffers, filledBuffers, stats), daemon=True)
+        reader.start()
+
+        try:
+            while True:
+                buffer, bytesRead = filledBuffers.get()
+                if isinstance(buffer, Exception):
+                    raise buffer
+
+                if not bytesRead:
+                    return
+
+                yield buffer, bytesRead
+                freeBuffers.put(buffer)
+        finally:
+            freeBuffers.put(None)
+            reader.join()
+
+    def __update(self, hashers, data):
+        # small buffer or XXH128 only => no thread hops
+        if len(hashers) == 1 or len(data) < PARALLEL_DIGEST_SIZE:
+            for hasher in hashers:
+                hasher.update(data)
+            return
+
+        # every digest on its own thread - the buffer is reused only when all of them are done
+        if self.digestPool is None:
+            self.digestPool = ThreadPoolExecutor(max_workers=max(len(DIGESTS), os.cpu_count() or 1), thread_name_prefix="ichk-digest")
+
+        futures = [self.digestPool.submit(hasher.update, data) for hasher in hashers[1:]]
+        hashers[0].update(data)
+        for future in futures:
+            future.result()
+
+    def __hashFile(self, fd, fileSize, taskNow):
+        totalStartTime = time.time()
+        totalCalcTime  = 0
+        totalRead      = 0
+        stats          = {'read': 0}
+        xxh128         = xxhash.xxh128()
+        hashers        = [xxh128] + [DIGESTS[digest]() for digest in self.digests]
+        droppedBytes   = 0
+
+        dev       = os.fstat(fd).st_dev
+        f, direct = self.__open(fd)
+        with f:
+            if self.dropCache:
+                fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+            blocks = self.__blocks(f, direct, dev, fileSize, stats)
+            try:
+                for buffer, bytesRead in blocks:
+                    if SIGINT_handler().SIGINT:
+                        return (None, None, None, None, None, droppedBytes)
+
+                    calcStartTime = time.time()
+                    self.__update(hashers, memoryview(buffer)[:bytesRead])
+                    totalCalcTime += (time.time() - calcStartTime)
+
+                    # already hashed data is not needed in page cache anymore
+                    if self.dropCache:
+                        droppedBytes += fadvise(f.fileno(), totalRead, bytesRead, os.POSIX_FADV_DONTNEED)
+
+                    totalRead += bytesRead
+                    self.p.progressAdvance(bytesRead, taskNow)
+            finally:
+                blocks.close()
+                if direct:
+                    setDirectIO(fd, False)
+
+            # large folios are dropped only when the range covers them whole - chunk boundaries rarely do
+            if self.dropCache:
+                fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+        # --metrics => read and hash time of whole file
+        if self.metrics:
+            self.metrics.add("read", dev, stats['read'])
+            self.metrics.add("hash", dev, totalCalcTime)
+
+        totalTime = time.time() - totalStartTime
+        fileSpeed = totalRead / (totalTime or 1)
+        readSpeed = totalRead / (stats['read'] or 1)
+        hashSpeed = totalRead / (totalCalcTime or 1)
+
+        return (
+            xxh128.hexdigest().upper(),
+            fileSpeed,
+            readSpeed,
+            hashSpeed,
+            {digest: hasher.hexdigest().upper() for digest, hasher in zip(self.digests, hashers[1:])},
+            droppedBytes
+        )
+
+    async def hashFile(self, fd, fileSize, taskNow=None):
+        *result, droppedBytes = await trio.to_thread.run_sync(self.__hashFile, fd, fileSize, taskNow)
+        self.droppedBytes += droppedBytes or 0
+        return tuple(result)
+
+    # .................................................................
+
+    def __hashChunk(self, fd, dev, offset, length, progress):
+        if self.metrics:
+            with self.metrics.phase("chunk", dev):
+                return self.__readChunk(fd, dev, offset, length, progress)
+
+        return self.__readChunk(fd, dev, offset, length, progress)
+
+    def __readChunk(self, fd, dev, offset, length, progress):
+        xxh128 = xxhash.xxh128()
+        buffer = memoryview(bytearray(max(1, min(self.blockSize(length), length))))
+        end    = offset + length
+        pos    = offset
+
+        while pos < end:
+            if SIGINT_handler().SIGINT:
+                return None
+
+            readStartTime = time.time()
+            bytesRead     = os.preadv(fd, [buffer[:min(len(buffer), end - pos)]], pos)
+            if not bytesRead:
+                break
+
+            self.__throttle(bytesRead, dev, time.time() - readStartTime)
+            xxh128.update(buffer[:bytesRead])
+            pos += bytesRead
+
+            with progress['lock']:
+                progress['bytes'] += bytesRead
+
+        if self.dropCache:
+            fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+
+        return xxh128.digest()
+
+    def __hashChunks(self, fd, fileSize, chunkSize, chunkNos, taskNow) -> dict:
+        progress      = {'lock': threading.Lock(), 'bytes': 0}
+        reportedBytes = 0
+        chunkDigests  = {}
+        dev           = os.fstat(fd).st_dev
+
+        if self.treePool is None:
+            self.treePool = ThreadPoolExecutor(max_workers=self.treeThreads, thread_name_prefix="ichk-tree")
+
+        futures = {
+            self.treePool.submit(self.__hashChunk, fd, dev, chunkNo * chunkSize, chunkLength(fileSize, chunkSize, chunkNo), progress): chunkNo
+            for chunkNo in chunkNos
+        }
+
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=PROGRESS_BATCH_TIME)
+                for future in done:
+                    chunkDigests[futures[future]] = future.result()
+
+                with progress['lock']:
+                    reportBytes = progress['bytes'] - reportedBytes
+                if reportBytes:
+                    self.p.progressAdvance(reportBytes, taskNow)
+                    reportedBytes += reportBytes
+        finally:
+            # failed chunk (EIO...) => other chunks must not read the descriptor after it is closed and reused
+            for future in pending:
+                future.cancel()
+            wait(pending)
+
+        return chunkDigests
+
+    def __hashTree(self, fd, fileSize, chunkSize, taskNow, knownChunks):
+        totalStartTime = time.time()
+        chunksCount    = chunksCountOf(fileSize, chunkSize)
+        chunkDigests   = [knownChunks.get(chunkNo) for chunkNo in range(chunksCount)]
+
+        # chunks already hashed by interrupted run (--resume) are only counted to progress
+        knownBytes = sum(chunkLength(fileSize, chunkSize, chunkNo) for chunkNo in knownChunks if chunkNo < chunksCount)
+        if knownBytes:
+            self.p.progressAdvance(knownBytes, taskNow)
+
+        missingChunks = [chunkNo for chunkNo in range(chunksCount) if chunkDigests[chunkNo] is None]
+        for chunkNo, chunkDigest in self.__hashChunks(fd, fileSize, chunkSize, missingChunks, taskNow).items():
+            chunkDigests[chunkNo] = chunkDigest
+
+        if None in chunkDigests:
+            return (None, None, None, None, chunkDigests)
+
+        # root is hash of concatenated chunk hashes
+        totalTime = time.time() - totalStartTime
+        fileSpeed = (fileSize - knownBytes) / (totalTime or 1)
+
+        return (
+            xxhash.xxh128(b"".join(chunkDigests)).hexdigest().upper(),
+            fileSpeed,
+            fileSpeed,
+            None,
+            chunkDigests
+        )
+
+    async def hashTree(self, fd, fileSize, chunkSize, taskNow=None, knownChunks=None):
+        return await trio.to_thread.run_sync(self.__hashTree, fd, fileSize, chunkSize, taskNow, knownChunks or {})
+
+    async def hashChunks(self, fd, fileSize, chunkSize, chunkNos, taskNow=None):
+        # only selected chunks (--scrub) - None when interrupted
+        chunkDigests = await trio.to_thread.run_sync(self.__hashChunks, fd, fileSize, chunkSize, chunkNos, taskNow)
+        if None in chunkDigests.values():
+            return None
+
+        return chunkDigests
+
+    # .................................................................
\ No newline at end of file
@@ -1,14 +1,20 @@
 # ==== BUILT-IN librariers of Python
-import os, platform, datetime
+import os, time, platform, datetime, calendar
 from array import array
+from contextlib import nullcontext
 from datetime import datetime as dt
+from functools import lru_cache
 
 # ==== EXTERNAL librariers installed by PyPI
 if platform.system() != "Windows":
     from xattr import xattr
     import fcntl
 
-import dateparser
+# dateparser is imported only when --verify-older-than is used - it takes most of startup time
+
+# ==== INTERNAL librariers
+from .store  import IChkXAttrStore
+from .engine import DIGESTS
 
 # ==== Constants
 FS_IOC_SETFLAGS = 0x40086602
@@ -17,39 +23,117 @@ FS_IMMUTABLE_FL	= 0x010
 
 #############################################################################################################
 ###### Internal class for providing access (read/write) file attributes
+###### File is opened once - stat, xattrs, ioctls and reads are done on the same descriptor
 #############################################################################################################
 class IChkFileAttributes():
 
-    def __init__(self, fileName) -> None:
+    def __init__(self, fileName, store=None, metrics=None) -> None:
         self.fileName     = fileName
-        self.fileSize     = os.path.getsize(fileName)
+        self.store        = store or IChkXAttrStore()
+        self.metrics      = metrics
+        startTime         = time.perf_counter()
+        self.fd           = os.open(fileName, os.O_RDONLY)
+        self.fileStat     = os.fstat(self.fd)
+        self.fileSize     = self.fileStat.st_size
         self.fileXAttrs   = None
         self.wasImmutable = False
 
         if platform.system() != "Windows":
-            self.xattr  = xattr(fileName)
+            self.xattr  = xattr(self.fd)
         else:
             self.xattr  = {}
 
+        # --metrics => open and fstat of the file
+        if self.metrics:
+            self.metrics.add("stat", self.fileStat.st_dev, time.perf_counter() - startTime)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def phase(self, phase):
+        # --metrics => latency of phase on device of the file
+        if self.metrics:
+            return self.metrics.phase(phase, self.fileStat.st_dev)
+
+        return nullcontext()
+
     # .................................................................
  
     def readXAttr(self):
-        self.fileXAttrs = {}
-
-        for xAttrName in self.xattr.keys():
-            if xAttrName.startswith("user.ichk."):
-                self.fileXAttrs |= {
-                    xAttrName.removeprefix("user."): self.xattr[xAttrName].decode()
-                }
-
+        with self.phase("xattr_read"):
+            self.fileXAttrs = self.store.read(self)
         return self.fileXAttrs
     
-    def writeXAttr(self, xxh128, oshash):
-        self.xattr["user.ichk.fsize"] = str(self.fileSize).encode("ascii")
-        self.xattr["user.ichk.xxh128"] = xxh128.encode("ascii")
-        self.xattr["user.ichk.oshash"] = oshash.encode("ascii")
-        self.xattr["user.ichk.updated"] = dt.now(datetime.UTC).strftime("%Y-%m-%dT%H:%M:%SZ").encode("ascii")
-        self.readXAttr()
+    def writeXAttr(self, xxh128, oshash, chunkSize=None, chunkDigests=None, digests=None):
+        values = {
+            "ichk.fsize": str(self.fileSize),
+            # ctime is not stored - setting xattrs and locking the file changes it
+            "ichk.ino": str(self.fileStat.st_ino),
+            "ichk.mtime": str(self.fileStat.st_mtime_ns),
+            "ichk.oshash": oshash,
+            "ichk.updated": dt.now(datetime.UTC).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+
+        # tree hash => xxh128 is root of chunk hashes, hash of the other mode is out of date
+        if chunkDigests is not None:
+            values |= {"ichk.xxh128tree": xxh128, "ichk.chunksize": str(chunkSize)}
+            staleNames = ["ichk.xxh128"]
+        else:
+            values |= {"ichk.xxh128": xxh128}
+            staleNames = ["ichk.xxh128tree", "ichk.chunksize"]
+
+        # --digest => every digest in its own attribute, digests not calculated now are out of date
+        values |= {f"ichk.{digest}": value for digest, value in (digests or {}).items()}
+        staleNames += [f"ichk.{digest}" for digest in DIGESTS if digest not in (digests or {})]
+
+        # attributes already read => only existing ones are removed
+        if self.fileXAttrs is not None:
+            staleNames = [name for name in staleNames if name in self.fileXAttrs]
+
+        # removed after write - file is never left without hash
+        with self.phase("xattr_write"):
+            self.store.write(self, values)
+            if chunkDigests is not None:
+                self.store.writeChunks(self, chunkSize, chunkDigests)
+            if staleNames:
+                self.store.remove(self, staleNames)
+
+        self.fileXAttrs = {name: value for name, value in (self.fileXAttrs or {}).items() if name not in staleNames} | values
+
+    def writeScrub(self, scrubSlice, scrubSlices, scrubBytes):
+        # next slice of rotation and bytes verified since rotation started
+        values = {
+            "ichk.scrub": f"{scrubSlice}/{scrubSlices}",
+            "ichk.scrubbytes": str(scrubBytes),
+        }
+
+        with self.phase("xattr_write"):
+            self.store.write(self, values)
+        self.fileXAttrs = (self.fileXAttrs or {}) | values
+
+    def scrubState(self, scrubSlices):
+        if self.fileXAttrs is None:
+            self.readXAttr()
+
+        # changed --scrub starts new rotation
+        try:
+            scrubSlice, storedSlices = map(int, self.fileXAttrs.get("ichk.scrub", "").split("/"))
+            scrubBytes = int(self.fileXAttrs.get("ichk.scrubbytes", "0"))
+        except ValueError:
+            return 0, 0
+
+        if storedSlices != scrubSlices or not 0 <= scrubSlice < scrubSlices:
+            return 0, 0
+
+        return scrubSlice, (scrubBytes if scrubSlice else 0)
     
     # .................................................................
 
@@ -59,23 +143,82 @@ class IChkFileAttributes():
         
         return (self.fileXAttrs.get("ichk.fsize") and 
                 self.fileXAttrs.get("ichk.oshash") and
-                self.fileXAttrs.get("ichk.xxh128"))
+                (self.fileXAttrs.get("ichk.xxh128") or self.fileXAttrs.get("ichk.xxh128tree")))
+
+    def storedXXH128(self) -> str:
+        if self.fileXAttrs is None:
+            self.readXAttr()
+
+        return self.fileXAttrs.get("ichk.xxh128") or self.fileXAttrs.get("ichk.xxh128tree", "")
+
+    def storedIsTree(self) -> bool:
+        # stored XXH128 is root of chunk hashes, not hash of the whole file
+        if self.fileXAttrs is None:
+            self.readXAttr()
+
+        return not self.fileXAttrs.get("ichk.xxh128") and bool(self.fileXAttrs.get("ichk.xxh128tree"))
+
+    def storedDigests(self, digests) -> dict:
+        if self.fileXAttrs is None:
+            self.readXAttr()
+
+        return {digest: self.fileXAttrs[f"ichk.{digest}"] for digest in digests if f"ichk.{digest}" in self.fileXAttrs}
     
-    def hasChecksumOlderThan(self, olderThanString) -> bool:
+    def hasSameSize(self) -> bool:
+        if self.fileXAttrs is None:
+            self.readXAttr()
+
+        return self.fileXAttrs.get("ichk.fsize") == str(self.fileSize)
+
+    def hasSameStat(self):
+        # None => no fingerprint stored by older version, it can't be decided by stat only
+        if self.fileXAttrs is None:
+            self.readXAttr()
+
+        fattrIno   = self.fileXAttrs.get("ichk.ino")
+        fattrMTime = self.fileXAttrs.get("ichk.mtime")
+        if fattrIno is None or fattrMTime is None:
+            return None
+
+        return (fattrIno == str(self.fileStat.st_ino) and
+                fattrMTime == str(self.fileStat.st_mtime_ns))
+
+    @staticmethod
+    def olderThanDate(olderThanString):
         if olderThanString == None or olderThanString == "" or olderThanString.lower() == "now":
+            return None
+
+        import dateparser
+        return dateparser.parse(olderThanString).astimezone(datetime.UTC)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def olderThanEpoch(olderThanString):
+        # parsed once per run - every file is compared with the same cutoff
+        olderThan = IChkFileAttributes.olderThanDate(olderThanString)
+        return olderThan.timestamp() if olderThan else None
+
+    @staticmethod
+    def updatedEpoch(updated):
+        # fixed "%Y-%m-%dT%H:%M:%SZ" format - slicing is much faster than strptime
+        try:
+            return calendar.timegm((int(updated[0:4]), int(updated[5:7]), int(updated[8:10]),
+                                    int(updated[11:13]), int(updated[14:16]), int(updated[17:19])))
+        except (TypeError, ValueError):
+            return None
+
+    def hasChecksumOlderThan(self, olderThanEpoch) -> bool:
+        if olderThanEpoch is None:
             return True
         
         if self.fileXAttrs is None:
             self.readXAttr()
 
-        fileUpdatedAt = self.fileXAttrs.get("ichk.updated")
-        if fileUpdatedAt == None:
+        fileUpdatedAt = self.updatedEpoch(self.fileXAttrs.get("ichk.updated"))
+        if fileUpdatedAt is None:
             return True
-        
-        fileUpdatedAt = dt.strptime(fileUpdatedAt, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=datetime.timezone.utc)
-        olderThan = dateparser.parse(olderThanString).astimezone(datetime.UTC)
 
-        return fileUpdatedAt < olderThan
+        return fileUpdatedAt < olderThanEpoch
 
     
     # .................................................................
@@ -84,9 +227,8 @@ class IChkFileAttributes():
         if platform.system() == "Windows":
             return False
         
-        with open(self.fileName, 'r') as f:
-            arg = array('L', [0])
-            fcntl.ioctl(f.fileno(), FS_IOC_GETFLAGS, arg, True)
+        arg = array('L', [0])
+        fcntl.ioctl(self.fd, FS_IOC_GETFLAGS, arg, True)
 
         return bool(arg[0] & FS_IMMUTABLE_FL)
     
@@ -95,42 +237,44 @@ class IChkFileAttributes():
             return False
         
         self.wasImmutable = True
-        with open(self.fileName, 'r') as f: 
-            arg = array('L', [0])
-            fcntl.ioctl(f.fileno(), FS_IOC_GETFLAGS, arg, True)
+        arg = array('L', [0])
+        fcntl.ioctl(self.fd, FS_IOC_GETFLAGS, arg, True)
 
-            arg[0] |= FS_IMMUTABLE_FL
-            fcntl.ioctl(f.fileno(), FS_IOC_SETFLAGS, arg, True)
+        arg[0] |= FS_IMMUTABLE_FL
+        fcntl.ioctl(self.fd, FS_IOC_SETFLAGS, arg, True)
 
     def unsetImmutable(self):
         if platform.system() == "Windows":
             return False
         
-        with open(self.fileName, 'r') as f: 
-            arg = array('L', [0])
-            fcntl.ioctl(f.fileno(), FS_IOC_GETFLAGS, arg, True)
-            arg[0] &= ~FS_IMMUTABLE_FL
-            fcntl.ioctl(f.fileno(), FS_IOC_SETFLAGS, arg, True)
+        arg = array('L', [0])
+        fcntl.ioctl(self.fd, FS_IOC_GETFLAGS, arg, True)
+        arg[0] &= ~FS_IMMUTABLE_FL
+        fcntl.ioctl(self.fd, FS_IOC_SETFLAGS, arg, True)
 
     def canSetImmutable(self) -> bool:
         return platform.system() != "Windows" and os.geteuid() == 0
 
     def relockFile(self):
         if self.wasImmutable and self.canSetImmutable():
-            self.setImmutable()
+            with self.phase("lock"):
+                self.setImmutable()
 
     def unlockFile(self):
         # set "-r--r--r--"
-        if self.canSetImmutable() and self.isImmutable():
-            self.unsetImmutable()
-            self.wasImmutable = True
+        if self.canSetImmutable():
+            with self.phase("unlock"):
+                if self.isImmutable():
+                    self.unsetImmutable()
+                    self.wasImmutable = True
 
     def lockFile(self):
-        # set "-r--r--r--"
-        os.chmod(self.fileName, 0o444)
+        with self.phase("lock"):
+            # set "-r--r--r--"
+            os.fchmod(self.fd, 0o444)
 
-        # set "+i"
-        if self.canSetImmutable():
-            self.setImmutable()
+            # set "+i"
+            if self.canSetImmutable():
+                self.setImmutable()
 
     # .................................................................
\ No newline at end of file
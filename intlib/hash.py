@@ -1,55 +1,49 @@
 # ==== BUILT-IN librariers of Python
-import os, sys, time, re, json
-from queue import Empty
+import os, sys, time, re
+from array import array
+from collections import OrderedDict
 
 # ==== EXTERNAL librariers installed by PyPI
-import xxhash
 import trio
-from rich import print as rprint
-from rich.progress import (
-    BarColumn,
-    DownloadColumn,
-    Progress,
-    TextColumn,
-    TimeRemainingColumn,
-    TransferSpeedColumn,
-    SpinnerColumn
-)
-from rich.table import Column
-from rich.live import Live
-from rich.padding import Padding
+# rich is imported only for coloured output and progress bar - plain and --format output don't need it
 
 # ==== INTERNAL librariers
 from .fattr import IChkFileAttributes
+from .engine import IChkHashEngine, fadvise, chunksCountOf, chunkLength
+from .limiter import openLimiter
 from .common import HumanBytes, SIGINT_handler, formatFileName
 
+# ==== Constants
+PROGRESS_REFRESH_TIME = 0.2     # seconds between progress samples
+LINKS_CACHE_SIZE      = 65536   # hashed hardlinked inodes kept for their other names
+
 #############################################################################################################
 ###### Internal class for providing file hashing progress bar
 #############################################################################################################
 class IChkFileHashProgress():
 
-    def __init__(self, enabled, cronicle) -> None:
+    def __init__(self, enabled, cronicle, jobs=1) -> None:
         self.enabled    = enabled
         self.cronicle   = cronicle
-        self.history    = []
-        self.maxHistory = 3
+        self.jobs       = jobs
         self.layout     = None
 
         self.progress   = None
         self.taskTotal  = None
-        self.taskNow    = None
 
-        self.total      = 0
-        self.totalRead  = 0
+        # counters are written without locks - every one has only one writer thread:
+        # totalFound by walker, totalSkipped/totalDone and slots by trio, slotRead[slot] by its hashing thread
+        self.totalFound    = 0
+        self.totalSkipped  = 0
+        self.totalDone     = 0
+        self.slotFiles     = []
+        self.slotActive    = []
+        self.slotSizes     = []
+        self.slotRead      = []
+        self.slotTasks     = []
+        self.freeSlots     = []
+
         self.cronicleProgress = ""
-        self.cronicleTable = {
-            "table": {
-                "title": "Files list",
-                "header": ["No.", "File name", "XXH128", "OSHASH", "Read speed", "Hash speed"],
-                "rows": [],
-                "caption": "Files list generated by ICHK tool (https://github.com/LukaszBrzyszkiewicz/IntegrityChecker)"
-            }
-        }
 
     def __enter__(self):
         if self.enabled and not self.cronicle:
@@ -60,22 +54,29 @@ class IChkFileHashProgress():
     
     def __exit__(self, exception_type, exception_value, exception_traceback):
         if self.layout:
+            self.render()
             self.layout.stop()
-            
-            self.layout  = None
-            self.total   = 0
-            self.history = []
+            self.layout = None
 
         if self.cronicle:
-            try:
-                print(json.dumps(self.cronicleTable, separators=(',', ':')))
-            except:
-                print("Internal JSON processing error...")
-                pass
+            self.render()
 
     # .................................................................
 
     def generateLayout(self):
+        from rich.progress import (
+            BarColumn,
+            DownloadColumn,
+            Progress,
+            TextColumn,
+            TimeRemainingColumn,
+            TransferSpeedColumn,
+            SpinnerColumn
+        )
+        from rich.table import Column
+        from rich.live import Live
+        from rich.padding import Padding
+
         self.txtcols = os.get_terminal_size().columns // 3
         self.progress = Progress(
             SpinnerColumn(),
@@ -94,7 +95,8 @@ class IChkFileHashProgress():
                 ))
         )
 
-        layout = Live(Padding(self.progress, (1, 0)), transient=False, refresh_per_second=30)
+        # rich refreshes only when render() sampled new values
+        layout = Live(Padding(self.progress, (1, 0)), transient=False, auto_refresh=False)
         self.taskTotal = self.progress.add_task(
                             f"[bright_yellow]TOTAL", filename="",
                             total=None, start=True, visible=True)
@@ -104,44 +106,79 @@ class IChkFileHashProgress():
     # .................................................................
     
     def advanceTotalSize(self, totalAdvance):
-        self.total += totalAdvance
+        self.totalFound += totalAdvance
 
-        if self.progress:
-            self.progress.update(self.taskTotal, total=self.total)
+    def reduceTotalSize(self, totalReduce):
+        self.totalSkipped += totalReduce
 
     def progressNewFile(self, fileName, fileSize):
-        if self.progress:
-            if self.taskNow:
-                self.progressEndFile()
+        if not (self.enabled or self.cronicle):
+            return None
 
-            self.taskNow = self.progress.add_task(
-                f"[dark_goldenrod]XXH128", filename=formatFileName(fileName, self.txtcols),
-                total=fileSize, start=True, visible=True)
-                        
-            if len(self.history) > self.maxHistory:
-                taskToRemove = self.history.pop(0)
-                self.progress.remove_task(taskToRemove)
-
-            self.history.append(self.taskNow)
+        # worker rows are reused - no rich task is added or removed per file
+        if self.freeSlots:
+            slot = self.freeSlots.pop()
+        else:
+            slot = len(self.slotFiles)
+            self.slotFiles.append(None)
+            self.slotActive.append(False)
+            self.slotSizes.append(0)
+            self.slotRead.append(0)
+            self.slotTasks.append(None)
+
+        self.slotRead[slot]  = 0
+        self.slotSizes[slot] = fileSize
+        self.slotFiles[slot] = fileName
+        self.slotActive[slot] = True
+        return slot
+
+    def progressEndFile(self, slot):
+        # row keeps showing finished file until the slot is reused
+        if slot is not None:
+            self.totalDone        += self.slotRead[slot]
+            self.slotActive[slot]  = False
+            self.freeSlots.append(slot)
+
+    def progressAdvance(self, advance, slot=None):
+        # called from hashing thread for every block - only bumps a counter
+        if slot is not None:
+            self.slotRead[slot] += advance
 
-    def progressEndFile(self):
-        if self.progress:
-            self.progress.stop_task(self.taskNow)
-            self.taskNow = None
+    # .................................................................
 
-    def progressAdvance(self, advance):
-        self.totalRead += advance
+    def render(self):
+        total     = self.totalFound - self.totalSkipped
+        totalRead = self.totalDone + sum(read for read, active in zip(self.slotRead, self.slotActive) if active)
 
         if self.cronicle:
-            newProgress = self.totalRead / self.total
+            newProgress = totalRead / (total or 1)
             newCronicleProgress = f'{{ "progress": {newProgress:.3f} }}'
             if newCronicleProgress != self.cronicleProgress:
                 print(newCronicleProgress)
                 self.cronicleProgress = newCronicleProgress
 
         if self.progress:
-            self.progress.advance(self.taskTotal, advance)
-            self.progress.advance(self.taskNow, advance)
+            self.progress.update(self.taskTotal, total=total, completed=totalRead)
+
+            for slot, fileName in enumerate(self.slotFiles):
+                if self.slotTasks[slot] is None:
+                    self.slotTasks[slot] = self.progress.add_task(
+                        f"[dark_goldenrod]XXH128", filename="", total=None, start=True, visible=True)
+
+                if fileName is not None:
+                    self.progress.update(self.slotTasks[slot], filename=formatFileName(fileName, self.txtcols),
+                                         total=self.slotSizes[slot], completed=self.slotRead[slot])
+
+            self.layout.refresh()
+
+    async def renderer(self):
+        # sampling at fixed rate keeps progress cost independent of files count and block size
+        if not (self.layout or self.cronicle):
+            return
+
+        while True:
+            self.render()
+            await trio.sleep(PROGRESS_REFRESH_TIME)
 
     # .................................................................
 
@@ -151,13 +188,30 @@ class IChkFileHashProgress():
 #############################################################################################################
 class IChkFileHash():
 
-    def __init__(self, arguments, progress) -> None:
+    def __init__(self, arguments, progress, store=None, journal=None, report=None, output=None, metrics=None) -> None:
         self.arg         = arguments.args
         self.p           = progress
+        self.store       = store
+        self.journal     = journal
+        self.report      = report
+        self.output      = output
+        self.metrics     = metrics
         self.colorStdOut = arguments.colorStdOut()
         self.colorStdErr = arguments.colorStdErr()
-        self.rateLimit   = arguments.args.rate_limit
+        self.limiter     = openLimiter(arguments.args)
+        self.engine      = IChkHashEngine(progress, arguments.args.buffer_size, self.limiter, arguments.args.drop_cache, arguments.args.direct_io, arguments.args.tree_threads, metrics, arguments.args.digest)
+        self.jobs        = max(1, arguments.args.jobs or 1)
+        self.fileNo      = 0
+        self.links       = OrderedDict()
+        self.olderThan   = IChkFileAttributes.olderThanEpoch(arguments.args.verify_older_than)
+
+        # --scrub => coverage of this run
+        self.scrubStats  = {'files': 0, 'bytes': 0, 'total': 0, 'covered': 0, 'failed': 0}
         
+        # --format => machine readable writer, no terminal formatting at all
+        if self.output:
+            return
+
         self.txtcols     = os.get_terminal_size().columns - 81
         if self.arg.no_stats: 
             self.txtcols += 23
@@ -168,6 +222,7 @@ class IChkFileHash():
 
     def printStdOut(self, text, fileName=""):
         if self.colorStdOut:
+            from rich import print as rprint
             if fileName:
                 rprint(text + formatFileName(fileName, self.txtcols, self.arg.no_ellipsis, True))
             else:
@@ -183,16 +238,20 @@ class IChkFileHash():
             else:
                 self.printStdOut(f"[bright_white][u]No.[/]  [u]XXH128[/]                           [u]OSHASH[/]           [u]Read speed[/]   [u]Hash speed[/]   [u]File name[/]")
 
-    def printNewHash(self, fileName, fileXX128Hash, fileOSHash, readBps=None, hashBps=None, hashOK=None):
+    def printNewHash(self, fileNo, fileName, fileXX128Hash, fileOSHash, readBps=None, hashBps=None, hashOK=None, fileSize=None, readBytes=None, digests=None, treeHash=False):
         readSpeedStr = ""
         hashSpeedStr = ""
         if readBps: readSpeedStr = f"{HumanBytes.format(readBps)}/s"
         if hashBps: hashSpeedStr = f"{HumanBytes.format(hashBps)}/s"
         
-        if self.arg.cronicle:
-            self.p.cronicleTable['table']['rows'] += [[
-                self.fileNo, fileName, fileXX128Hash, fileOSHash, readSpeedStr, hashSpeedStr
-            ]]
+        # --report/--cronicle => rows are streamed, only aggregated stats stay in memory
+        if self.report:
+            self.report.addFile(fileNo, fileName, fileXX128Hash, fileOSHash, fileSize, readBytes, readBps, hashBps, hashOK, digests)
+
+        if self.output:
+            if not self.arg.quiet:
+                self.output.writeFile(fileNo, fileName, fileXX128Hash, fileOSHash, fileSize, readBps, hashBps, hashOK, digests, treeHash)
+            return
 
         if hashOK == True:
             hashColor = "bright_green"
@@ -206,30 +265,45 @@ class IChkFileHash():
 
         if not self.arg.quiet:
             if self.arg.no_stats:
-                self.printStdOut(f"[bright_cyan]{self.fileNo:<4}[/] [{hashColor}]{fileXX128Hash}[/] [{oshashColor}]{fileOSHash}[/] ", fileName)
+                self.printStdOut(f"[bright_cyan]{fileNo:<4}[/] [{hashColor}]{fileXX128Hash}[/] [{oshashColor}]{fileOSHash}[/] ", fileName)
             else:
-                self.printStdOut(f"[bright_cyan]{self.fileNo:<4}[/] [{hashColor}]{fileXX128Hash}[/] [{oshashColor}]{fileOSHash}[/] {readSpeedStr:<12} {hashSpeedStr:<12} ", fileName)
+                self.printStdOut(f"[bright_cyan]{fileNo:<4}[/] [{hashColor}]{fileXX128Hash}[/] [{oshashColor}]{fileOSHash}[/] {readSpeedStr:<12} {hashSpeedStr:<12} ", fileName)
 
     def printErrHash(self, fileName, hashType, fileHash, calcHash):
         print(f"{hashType} {fileHash} != {calcHash} {fileName}", file=sys.stderr)
 
+    def printSummary(self):
+        if self.arg.drop_cache and not self.arg.no_stats:
+            print(f"Dropped {HumanBytes.format(self.engine.droppedBytes)} from page cache", file=sys.stderr)
+
+        if self.limiter and not self.arg.no_stats:
+            print(f"Rate limiter waited {self.limiter.waitTime:.1f}s", file=sys.stderr)
+
+        if self.arg.scrub and not self.arg.no_stats:
+            s = self.scrubStats
+            print(f"Scrubbed {HumanBytes.format(s['bytes'])} of {HumanBytes.format(s['total'])} "
+                  f"({s['bytes'] / (s['total'] or 1):.1%}) in {s['files']} files, "
+                  f"{s['covered']} files fully covered, {s['failed']} failed", file=sys.stderr)
+
     # .................................................................
 
     def __sumBytes(self, bytesView: memoryview):
-        bsum = 0
-        sz = len(bytesView) // 8
-        for x in range(sz):
-            bsum = (bsum + int.from_bytes(bytesView[8*x : 8*(x+1)], byteorder='little', signed=False)) & 0xFFFFFFFFFFFFFFFF
-        
-        return bsum
+        # reinterpret buffer as uint64 words and sum them in C instead of slicing every 8 bytes
+        words = bytesView.cast('Q')
+        if sys.byteorder != 'little':
+            words = array('Q', words)
+            words.byteswap()
+
+        return sum(words) & 0xFFFFFFFFFFFFFFFF
 
     # .................................................................
 
-    async def calculateOSHASH(self, fileName):
-        fs = os.path.getsize(fileName)
+    def __oshash(self, fileAttr):
+        fs = fileAttr.fileSize
+        droppedBytes = 0
         if fs <= 8:
             oshash = 0
-            return f"{oshash:016X}".upper()
+            return f"{oshash:016X}".upper(), droppedBytes
 
         oshash    = None
         chunkSize = 64 * 1024
@@ -241,10 +315,18 @@ class IChkFileHash():
         tailBytes = bytearray(chunkSize)
         tailView  = memoryview(tailBytes)
 
-        async with await trio.open_file(fileName, 'rb', buffering=0) as f:
-            headBytesRead = await f.readinto(headView)
-            await f.seek(-chunkSize, os.SEEK_END)
-            tailBytesRead = await f.readinto(tailView)
+        with open(fileAttr.fd, 'rb', buffering=0, closefd=False) as f:
+            readStartTime = time.time()
+            headBytesRead = f.readinto(headView)
+            f.seek(-chunkSize, os.SEEK_END)
+            tailBytesRead = f.readinto(tailView)
+
+            if self.limiter:
+                self.limiter.acquire(headBytesRead + tailBytesRead, fileAttr.fileStat.st_dev, time.time() - readStartTime)
+
+            if self.engine.dropCache:
+                droppedBytes += fadvise(f.fileno(), 0, chunkSize, os.POSIX_FADV_DONTNEED)
+                droppedBytes += fadvise(f.fileno(), fs - chunkSize, chunkSize, os.POSIX_FADV_DONTNEED)
 
             if headBytesRead == tailBytesRead and headBytesRead == chunkSize:
                 headBytesSum = self.__sumBytes(headView)
@@ -254,63 +336,40 @@ class IChkFileHash():
                 oshash = (oshash + fs) & 0xFFFFFFFFFFFFFFFF
 
         assert f.closed
-        return f"{oshash:016X}".upper()
+        return f"{oshash:016X}".upper(), droppedBytes
 
-    async def calculateXXH128(self, fileName):
-        self.p.progressNewFile(fileName, os.path.getsize(fileName))
+    def __timedOSHASH(self, fileAttr):
+        with fileAttr.phase("oshash"):
+            return self.__oshash(fileAttr)
 
-        totalStartTime = time.time()
-        totalReadTime  = 0
-        totalCalcTime  = 0
+    async def calculateOSHASH(self, fileAttr):
+        # whole head/tail read in one thread hop
+        oshash, droppedBytes = await trio.to_thread.run_sync(self.__timedOSHASH, fileAttr)
+        self.engine.droppedBytes += droppedBytes
+        return oshash
 
-        async with await trio.open_file(fileName, "rb", buffering=0) as f:
-            __memBytes    = bytearray(1024 * 1024)   # 1'048'576
-            memView       = memoryview(__memBytes)           
-            xxh128        = xxhash.xxh128()
+    async def calculateXXH128(self, fileAttr):
+        taskNow  = self.p.progressNewFile(fileAttr.fileName, fileAttr.fileSize)
 
-            readStartTime = time.time()
-            bytesRead     = await f.readinto(memView)
-            readDiffTime  = (time.time() - readStartTime)
-            totalReadTime += readDiffTime
-
-            totalRead     = 0
-            while bytesRead != None and bytesRead > 0:
-                if SIGINT_handler().SIGINT: 
-                    return (None, None, None, None)
-                
-                totalRead += bytesRead
-
-                calcStartTime = time.time()
-                xxh128.update(memView[:bytesRead])
-                self.p.progressAdvance(bytesRead)
-                totalCalcTime += (time.time() - calcStartTime)
-                
-                if self.rateLimit:
-                    rateLimitDiffTime  = (time.time() - readStartTime)
-                    rateLimitSleepTime = (((1024 * 1024) / 1000000) / self.rateLimit) - rateLimitDiffTime
-                    if rateLimitSleepTime > 0:
-                        await trio.sleep(rateLimitSleepTime)
-
-                readStartTime = time.time()
-                bytesRead     = await f.readinto(memView)
-                readDiffTime  = (time.time() - readStartTime)                
-                totalReadTime += readDiffTime
+        try:
+            return await self.engine.hashFile(fileAttr.fd, fileAttr.fileSize, taskNow)
+        finally:
+            self.p.progressEndFile(taskNow)
 
-        
-        assert f.closed
-        self.p.progressEndFile()
-
-        totalTime = time.time() - totalStartTime
-        fileSpeed = totalRead / (totalTime or 1)
-        readSpeed = totalRead / (totalReadTime or 1)
-        hashSpeed = totalRead / (totalCalcTime or 1)
-
-        return (
-            xxh128.hexdigest().upper(),
-            fileSpeed,
-            readSpeed,
-            hashSpeed
-        )
+    async def calculateTree(self, fileAttr, chunkSize):
+        taskNow     = self.p.progressNewFile(fileAttr.fileName, fileAttr.fileSize)
+        knownChunks = self.journal.partialChunks(fileAttr, chunkSize) if self.journal else {}
+
+        try:
+            result = await self.engine.hashTree(fileAttr.fd, fileAttr.fileSize, chunkSize, taskNow, knownChunks)
+        finally:
+            self.p.progressEndFile(taskNow)
+
+        # --journal => keep already hashed chunks for --resume
+        if result[0] is None and self.journal:
+            self.journal.recordChunks(fileAttr, chunkSize, result[4])
+
+        return result
 
     # .................................................................
 
@@ -326,6 +385,19 @@ class IChkFileHash():
         
     #     return True  
     
+    def verifySTAT(self, fileName, fileAttr):
+        if not fileAttr.hasSameSize():
+            self.printErrHash(fileName, "FSIZE", fileAttr.fileXAttrs.get('ichk.fsize', ''), fileAttr.fileSize)
+            return False
+
+        sameStat = fileAttr.hasSameStat()
+        if sameStat is False and self.arg.verify_depth == "stat":
+            fattrStat = f"{fileAttr.fileXAttrs.get('ichk.ino')}:{fileAttr.fileXAttrs.get('ichk.mtime')}"
+            fileStat  = f"{fileAttr.fileStat.st_ino}:{fileAttr.fileStat.st_mtime_ns}"
+            self.printErrHash(fileName, "STAT", fattrStat, fileStat)
+
+        return sameStat
+
     async def verifyOSHASH(self, fileName, fileAttr, fileOSHASH):
         fattrOSHASH = fileAttr.fileXAttrs.get('ichk.oshash', '')
         if fattrOSHASH.upper() != fileOSHASH.upper():
@@ -342,15 +414,187 @@ class IChkFileHash():
         
         return True
 
+    async def verifyDigests(self, fileName, fileAttr, fileDigests):
+        # every digest is checked on its own - files scanned before --digest was used have only some of them
+        digestsOK = True
+        for digest, fileDigest in fileDigests.items():
+            fattrDigest = fileAttr.fileXAttrs.get(f"ichk.{digest}")
+            if fattrDigest is not None and fattrDigest.upper() != fileDigest.upper():
+                self.printErrHash(fileName, digest.upper(), fattrDigest, fileDigest)
+                digestsOK = False
+
+        return digestsOK
+
+    async def verifyTree(self, fileName, fileAttr, fileXXH128, chunkSize, chunkDigests):
+        fattrXXH128 = fileAttr.fileXAttrs.get('ichk.xxh128tree', '')
+        if fattrXXH128.upper() == fileXXH128.upper():
+            return True
+
+        self.printErrHash(fileName, "XXH128TREE", fattrXXH128, fileXXH128)
+
+        # stored chunk hashes point to exact corrupted byte ranges
+        storedChunks = fileAttr.store.readChunks(fileAttr)
+        if storedChunks and storedChunks[0] == chunkSize and len(storedChunks[1]) == len(chunkDigests):
+            for chunkNo, (storedDigest, chunkDigest) in enumerate(zip(storedChunks[1], chunkDigests)):
+                if storedDigest != chunkDigest:
+                    chunkStart = chunkNo * chunkSize
+                    chunkEnd   = min(chunkStart + chunkSize, fileAttr.fileSize) - 1
+                    print(f"XXH128TREE chunk {chunkNo} bytes {chunkStart}-{chunkEnd} {fileName}", file=sys.stderr)
+
+        return False
+
+    def scrubChunks(self, fileAttr):
+        # stored chunk hashes are needed - without them whole file is verified
+        if not fileAttr.fileXAttrs.get('ichk.xxh128tree'):
+            return None
+
+        storedChunks = fileAttr.store.readChunks(fileAttr)
+        chunkSize    = self.treeChunkSize(fileAttr, True)
+        if not storedChunks or storedChunks[0] != chunkSize or len(storedChunks[1]) != chunksCountOf(fileAttr.fileSize, chunkSize):
+            return None
+
+        return storedChunks
+
+    async def scrubTree(self, fileNo, fileName, fileAttr, fileOSHASH, storedChunks):
+        chunkSize   = storedChunks[0]
+        chunksCount = len(storedChunks[1])
+
+        # every N-th chunk, starting at stored slice, so N runs read whole file once
+        scrubSlices            = self.arg.scrub
+        scrubSlice, scrubBytes = fileAttr.scrubState(scrubSlices)
+        chunkNos               = list(range(scrubSlice, chunksCount, scrubSlices))
+        sliceBytes             = sum(chunkLength(fileAttr.fileSize, chunkSize, chunkNo) for chunkNo in chunkNos)
+
+        if self.p: self.p.reduceTotalSize(fileAttr.fileSize - sliceBytes)
+        taskNow = self.p.progressNewFile(fileName, sliceBytes)
+        try:
+            chunkDigests = await self.engine.hashChunks(fileAttr.fd, fileAttr.fileSize, chunkSize, chunkNos, taskNow)
+        finally:
+            self.p.progressEndFile(taskNow)
+
+        if chunkDigests is None:
+            return None
+
+        hashOK = True
+        for chunkNo in chunkNos:
+            if chunkDigests[chunkNo] != storedChunks[1][chunkNo]:
+                chunkStart = chunkNo * chunkSize
+                chunkEnd   = chunkStart + chunkLength(fileAttr.fileSize, chunkSize, chunkNo) - 1
+                print(f"XXH128TREE chunk {chunkNo} bytes {chunkStart}-{chunkEnd} {fileName}", file=sys.stderr)
+                hashOK = False
+
+        if not self.arg.get_xattr:
+            self.printNewHash(fileNo, fileName, fileAttr.storedXXH128(), fileOSHASH, hashOK=hashOK, fileSize=fileAttr.fileSize, readBytes=sliceBytes, treeHash=True)
+
+        # rotation state is written even without --set-xattr - next run continues with next slice
+        scrubBytes += sliceBytes
+        if fileAttr.store.inFile:
+            fileAttr.unlockFile()
+        fileAttr.writeScrub((scrubSlice + 1) % scrubSlices, scrubSlices, scrubBytes)
+        if fileAttr.store.inFile:
+            fileAttr.relockFile()
+
+        self.scrubStats['files']   += 1
+        self.scrubStats['bytes']   += sliceBytes
+        self.scrubStats['total']   += fileAttr.fileSize
+        self.scrubStats['covered'] += int(scrubSlice + 1 == scrubSlices)
+        self.scrubStats['failed']  += int(not hashOK)
+
+        return hashOK
+
+    def useTreeHash(self, fileAttr, doVerify):
+        # verification uses hash which file has, --tree-hash prefers tree one
+        if doVerify:
+            if fileAttr.fileXAttrs.get('ichk.xxh128tree') and (self.arg.tree_hash or not fileAttr.fileXAttrs.get('ichk.xxh128')):
+                return True
+            if fileAttr.fileXAttrs.get('ichk.xxh128'):
+                return False
+
+        return self.arg.tree_hash
+
+    def treeChunkSize(self, fileAttr, doVerify) -> int:
+        if doVerify and fileAttr.fileXAttrs.get('ichk.chunksize'):
+            return int(fileAttr.fileXAttrs['ichk.chunksize'])
+
+        return int(self.arg.chunk_size * 1024 * 1024)
+
     # .................................................................
 
     # TODO: add always checking FSIZE and OSHASH for files
 
-    async def calculate(self, fileName):
+    async def calculate(self, fileNo, fileName):
+        # one descriptor for stat, xattrs, ioctls and reads of the file
+        try:
+            with IChkFileAttributes(fileName, self.store, self.metrics) as fileAttr, fileAttr.phase("file"):
+                if fileAttr.fileStat.st_nlink > 1:
+                    await self.calculateLink(fileNo, fileName, fileAttr)
+                else:
+                    await self.calculateFile(fileNo, fileName, fileAttr)
+        except OSError as e:
+            # file removed, not readable or attributes can't be set - other files are still processed
+            print(f"ERROR: {e.strerror or e} {fileName}", file=sys.stderr)
+
+        # --watch => results can't wait for the end of run in output buffer
+        if self.output and self.arg.watch:
+            self.output.flush()
+
+    async def calculateLink(self, fileNo, fileName, fileAttr):
+        # hardlinked inode is read once - other names reuse its result
+        linkKey = (fileAttr.fileStat.st_dev, fileAttr.fileStat.st_ino)
+        link    = self.links.get(linkKey)
+
+        # other worker is hashing the same inode right now
+        while link is not None and link['result'] is None and link['pending']:
+            await link['pending'].wait()
+            link = self.links.get(linkKey)
+
+        if link is not None and link['result'] is not None:
+            self.links.move_to_end(linkKey)
+            fileXXH128, fileOSHASH, hashOK, fileDigests, treeHash, written = link['result']
+            if not self.arg.get_xattr:
+                self.printNewHash(fileNo, fileName, fileXXH128, fileOSHASH, hashOK=hashOK, fileSize=fileAttr.fileSize, digests=fileDigests, treeHash=treeHash)
+
+            # --catalog => attributes are kept per name, not per inode - every name gets what the first one got
+            if written and self.arg.set_xattr and not fileAttr.store.inFile:
+                fileAttr.writeXAttr(*written)
+            if self.p: self.p.reduceTotalSize(fileAttr.fileSize)
+            if self.journal:
+                self.journal.record(fileAttr, fileXXH128, hashOK)
+        else:
+            link = self.links[linkKey] = {'result': None, 'pending': trio.Event(), 'names': 0}
+            try:
+                link['result'] = await self.calculateFile(fileNo, fileName, fileAttr)
+            finally:
+                link['pending'].set()
+                link['pending'] = None
+
+        # all names seen => result is not needed anymore
+        link['names'] += 1
+        if link['names'] >= fileAttr.fileStat.st_nlink or link['result'] is None:
+            self.links.pop(linkKey, None)
+
+        # other names can be outside of processed tree (snapshots) - the least recently used results are dropped
+        while len(self.links) > LINKS_CACHE_SIZE:
+            oldKey, oldLink = self.links.popitem(last=False)
+            if oldLink['pending'] is not None:
+                # still hashed by other worker - its waiters need it
+                self.links[oldKey] = oldLink
+
+    async def calculateFile(self, fileNo, fileName, fileAttr):
         calcStartTime = time.time()
 
-        fileAttr  = IChkFileAttributes(fileName)
-        doCalc    = False
+        doCalc      = False
+        fileXXH128  = None
+        fileOSHASH  = None
+        fileDigests = None
+        hashOK      = None
+        useTree     = False
+        written     = None
+
+        # --resume => skip files already processed by interrupted run
+        if self.journal and self.journal.isDone(fileAttr):
+            if self.p: self.p.reduceTotalSize(fileAttr.fileSize)
+            return
 
         # none argument passed and not quiet also
         if (not self.arg.calculate and 
@@ -360,45 +604,103 @@ class IChkFileHash():
 
         # --verify-xattr => calculate for files with checksum data
         if self.arg.verify_xattr:
-            doCalc = fileAttr.hasChecksumInfo() and fileAttr.hasChecksumOlderThan(self.arg.verify_older_than)
+            doCalc = fileAttr.hasChecksumInfo() and fileAttr.hasChecksumOlderThan(self.olderThan)
 
         # --calculate => calculate only files without checksum data
         if self.arg.calculate and not fileAttr.hasChecksumInfo():
             doCalc = True
 
+        # --watch => file was written again, stored checksum data is out of date
+        if self.arg.calculate and self.arg.watch and fileAttr.hasSameStat() is False:
+            doCalc = True
+
         # --get-xattr => get data from file and print it
         if self.arg.get_xattr and fileAttr.hasChecksumInfo():
             fattrOSHASH = fileAttr.fileXAttrs.get('ichk.oshash', '')
-            fattrXXH128 = fileAttr.fileXAttrs.get('ichk.xxh128', '')
-            self.printNewHash(fileName, fattrXXH128, fattrOSHASH)
+            fattrXXH128 = fileAttr.storedXXH128()
+            self.printNewHash(fileNo, fileName, fattrXXH128, fattrOSHASH, fileSize=fileAttr.fileSize, digests=fileAttr.storedDigests(self.arg.digest or []), treeHash=fileAttr.storedIsTree())
+
+        # --verify-xattr => files with checksum data are checked in tiers: stat, OSHASH and XXH128
+        doVerify = doCalc and self.arg.verify_xattr and fileAttr.hasChecksumInfo()
+
+        #### Stat only check
+        if doVerify:
+            sameStat = self.verifySTAT(fileName, fileAttr)
+
+            # different size => file changed, no need to read it
+            if not fileAttr.hasSameSize():
+                doCalc = False
+
+            # --verify-depth stat => done if fingerprint was stored
+            elif self.arg.verify_depth == "stat" and sameStat is not None:
+                if not self.arg.get_xattr:
+                    self.printNewHash(fileNo, fileName, fileAttr.storedXXH128(), fileAttr.fileXAttrs.get('ichk.oshash', ''), hashOK=sameStat, fileSize=fileAttr.fileSize, treeHash=fileAttr.storedIsTree())
+                doCalc = False
 
         #### First OSHASH calculation
         if doCalc:
-            fileOSHASH = await self.calculateOSHASH(fileName)
+            fileOSHASH = await self.calculateOSHASH(fileAttr)
             
             # --verify-xattr => print different things
-            if self.arg.verify_xattr and fileAttr.hasChecksumInfo():
+            if doVerify:
                 doCalc = await self.verifyOSHASH(fileName, fileAttr, fileOSHASH)
 
+                # --verify-depth oshash => done after fast check
+                if doCalc and self.arg.verify_depth != "full":
+                    if not self.arg.get_xattr:
+                        self.printNewHash(fileNo, fileName, fileAttr.storedXXH128(), fileOSHASH, hashOK=True, fileSize=fileAttr.fileSize, treeHash=fileAttr.storedIsTree())
+                    doCalc = False
+
+        #### Rotating partial verification of chunks
+        storedChunks = self.scrubChunks(fileAttr) if doCalc and doVerify and self.arg.scrub else None
+        if storedChunks:
+            hashOK = await self.scrubTree(fileNo, fileName, fileAttr, fileOSHASH, storedChunks)
+            if hashOK is None:
+                return
+
+            fileXXH128 = fileAttr.storedXXH128()
+            useTree    = True
+            doCalc     = False
+
         #### Second HASH calculation
         if doCalc:
-            fileXXH128, fileBps, readBps, hashBps = await self.calculateXXH128(fileName)
+            # --tree-hash => chunks hashed in parallel, xxh128 is root of chunk hashes
+            useTree      = self.useTreeHash(fileAttr, doVerify)
+            chunkSize    = None
+            chunkDigests = None
+
+            if useTree:
+                chunkSize = self.treeChunkSize(fileAttr, doVerify)
+                fileXXH128, fileBps, readBps, hashBps, chunkDigests = await self.calculateTree(fileAttr, chunkSize)
+            else:
+                fileXXH128, fileBps, readBps, hashBps, fileDigests = await self.calculateXXH128(fileAttr)
+
             if fileXXH128 is None:
                 return
 
             # --verify-xattr => print different things
             hashOK = None
-            if self.arg.verify_xattr and fileAttr.hasChecksumInfo():
+            if doVerify and useTree:
+                hashOK = await self.verifyTree(fileName, fileAttr, fileXXH128, chunkSize, chunkDigests)
+            elif doVerify:
                 hashOK = await self.verifyXXH128(fileName, fileAttr, fileXXH128)
 
+            # --digest => extra digests are verified against their own attributes
+            if doVerify and fileDigests:
+                digestsOK = await self.verifyDigests(fileName, fileAttr, fileDigests)
+                hashOK    = hashOK and digestsOK
+
             if not self.arg.get_xattr:
-                self.printNewHash(fileName, fileXXH128, fileOSHASH, readBps, hashBps, hashOK)
+                self.printNewHash(fileNo, fileName, fileXXH128, fileOSHASH, readBps, hashBps, hashOK, fileAttr.fileSize, fileAttr.fileSize, fileDigests, useTree)
 
             # --set-xattr => set extended attributes only for files without checksum data
             if self.arg.set_xattr: # and not fileAttr.hasChecksumInfo():
-                fileAttr.unlockFile()
+                # with catalog immutable file has to be unlocked only for changing its mode
+                if fileAttr.store.inFile or self.arg.lock_file:
+                    fileAttr.unlockFile()
                 # try:
-                fileAttr.writeXAttr(fileXXH128, fileOSHASH)
+                fileAttr.writeXAttr(fileXXH128, fileOSHASH, chunkSize, chunkDigests, fileDigests)
+                written = (fileXXH128, fileOSHASH, chunkSize, chunkDigests, fileDigests)
                 # except:
                     # pass
 
@@ -407,25 +709,37 @@ class IChkFileHash():
                     fileAttr.lockFile()
                 else:
                     fileAttr.relockFile()
-        elif self.p:
-            self.p.advanceTotalSize(-fileAttr.fileSize)
+        elif self.p and not storedChunks:
+            self.p.reduceTotalSize(fileAttr.fileSize)
+
+        # interrupted file returns earlier, so only completed files are journaled
+        if self.journal:
+            self.journal.record(fileAttr, fileXXH128, hashOK)
+
+        # fully hashed result can be reused for other hardlinks
+        if fileXXH128 is not None and fileOSHASH is not None:
+            return fileXXH128, fileOSHASH, hashOK, fileDigests, useTree, written
 
         # print(f'Time: {time.time() - calcStartTime}')
 
     # .................................................................
 
-    async def traverse(self, queue):
+    async def worker(self, receiveChannel):
+        # closing all receivers on Ctrl+C stops traverser too
+        async with receiveChannel:
+            async for fileName, _ in receiveChannel:
+                if SIGINT_handler().SIGINT:
+                    return
+
+                # numbering is assigned in queue order, so it stays stable when files finish out of order
+                self.fileNo += 1
+                await self.calculate(self.fileNo, fileName)
+
+    async def traverse(self, receiveChannel):
         self.fileNo = 0
-        abort = False
-        while not abort:
-            try:
-                fileName = queue.get_nowait()
-                if fileName == "**END**" or SIGINT_handler().SIGINT:
-                    abort = True
-                else:
-                    self.fileNo += 1
-                    await self.calculate(fileName)
-            except Empty:
-                await trio.sleep(0.1)
+        async with trio.open_nursery() as nursery:
+            async with receiveChannel:
+                for _ in range(self.jobs):
+                    nursery.start_soon(self.worker, receiveChannel.clone())
 
     # .................................................................
\ No newline at end of file
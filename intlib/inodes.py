@@ -0,0 +1,64 @@
+# ==== BUILT-IN librariers of Python
+import heapq
+from array import array
+from bisect import bisect_left
+
+# ==== Constants
+PENDING_SIZE = 4096         # inodes kept in plain set before packing to sorted array
+
+#############################################################################################################
+###### Internal class for providing compact set of (st_dev, st_ino) keys
+#############################################################################################################
+class IChkInodeSet():
+
+    def __init__(self) -> None:
+        # per device: recent inodes in a set and older ones in sorted uint64 arrays (8 bytes per inode),
+        # arrays have growing sizes and are merged like binary counter, so adding is amortized O(log n)
+        self.pending = {}
+        self.runs    = {}
+        self.count   = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, key) -> bool:
+        dev, ino = key
+        if ino in self.pending.get(dev, ()):
+            return True
+
+        for run in self.runs.get(dev, ()):
+            i = bisect_left(run, ino)
+            if i < len(run) and run[i] == ino:
+                return True
+
+        return False
+
+    def add(self, key) -> bool:
+        # returns False when key was already in the set
+        if key in self:
+            return False
+
+        dev, ino = key
+        pending  = self.pending.setdefault(dev, set())
+        pending.add(ino)
+        self.count += 1
+
+        if len(pending) >= PENDING_SIZE:
+            self.pack(dev)
+
+        return True
+
+    def pack(self, dev):
+        runs = self.runs.setdefault(dev, [])
+        run  = array('Q', sorted(self.pending.pop(dev)))
+
+        while runs and len(runs[-1]) <= len(run):
+            run = array('Q', heapq.merge(runs.pop(), run))
+
+        runs.append(run)
+
+    def sizeOf(self) -> int:
+        # approximate memory used by packed and pending inodes
+        packed  = sum(run.itemsize * len(run) for runs in self.runs.values() for run in runs)
+        pending = sum(len(inodes) for inodes in self.pending.values()) * 64
+        return packed + pending
@@ -0,0 +1,116 @@
+# ==== BUILT-IN librariers of Python
+import os, time, json
+from contextlib import nullcontext
+
+# ==== Constants
+JOURNAL_BATCH_SIZE = 256        # records written with one fsync
+JOURNAL_BATCH_TIME = 1.0        # max seconds between fsyncs
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def openJournal(args):
+    if args.journal:
+        return IChkJournal(args.journal, args.resume)
+
+    return nullcontext()
+
+#############################################################################################################
+###### Internal class for providing crash-safe journal of processed files
+#############################################################################################################
+class IChkJournal():
+
+    def __init__(self, journalPath, resume=False) -> None:
+        self.journalPath = journalPath
+        self.done        = set([])
+        self.partial     = {}
+        self.batch       = []
+        self.flushTime   = time.time()
+
+        if resume:
+            self.load()
+
+        # new run starts new journal, resumed one continues it
+        self.journal = open(journalPath, 'a' if resume else 'w', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.close()
+
+    def close(self):
+        if self.journal:
+            self.flush()
+            self.journal.close()
+            self.journal = None
+
+    # .................................................................
+
+    @staticmethod
+    def fileKey(fileStat):
+        # changed file (size or mtime) has to be processed again
+        return (fileStat.st_dev, fileStat.st_ino, fileStat.st_size, fileStat.st_mtime_ns)
+
+    def load(self):
+        try:
+            with open(self.journalPath, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record  = json.loads(line)
+                        fileKey = (record["dev"], record["ino"], record["fsize"], record["mtime"])
+
+                        # chunks of tree hash finished before interruption
+                        if record.get("partial"):
+                            chunks = self.partial.setdefault((fileKey, record["chunksize"]), {})
+                            chunks |= {int(chunkNo): bytes.fromhex(digest) for chunkNo, digest in record["chunks"].items()}
+                        else:
+                            self.done.add(fileKey)
+                    except (ValueError, KeyError):
+                        # last line could be cut by crash
+                        continue
+        except FileNotFoundError:
+            pass
+
+    def isDone(self, fileAttr) -> bool:
+        return self.fileKey(fileAttr.fileStat) in self.done
+
+    def partialChunks(self, fileAttr, chunkSize) -> dict:
+        return self.partial.get((self.fileKey(fileAttr.fileStat), chunkSize), {})
+
+    # .................................................................
+
+    def record(self, fileAttr, xxh128=None, hashOK=None):
+        fileStat = fileAttr.fileStat
+        self.batch.append(json.dumps({
+            "dev": fileStat.st_dev, "ino": fileStat.st_ino,
+            "fsize": fileStat.st_size, "mtime": fileStat.st_mtime_ns,
+            "xxh128": xxh128, "ok": hashOK, "path": fileAttr.fileName
+        }, separators=(',', ':')))
+
+        if len(self.batch) >= JOURNAL_BATCH_SIZE or time.time() - self.flushTime >= JOURNAL_BATCH_TIME:
+            self.flush()
+
+    def recordChunks(self, fileAttr, chunkSize, chunkDigests):
+        fileStat = fileAttr.fileStat
+        self.batch.append(json.dumps({
+            "dev": fileStat.st_dev, "ino": fileStat.st_ino,
+            "fsize": fileStat.st_size, "mtime": fileStat.st_mtime_ns,
+            "partial": True, "chunksize": chunkSize,
+            "chunks": {chunkNo: digest.hex() for chunkNo, digest in enumerate(chunkDigests) if digest is not None},
+            "path": fileAttr.fileName
+        }, separators=(',', ':')))
+
+        # interrupted run should not lose already hashed chunks
+        self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.journal.write("\n".join(self.batch) + "\n")
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.batch = []
+
+        self.flushTime = time.time()
+
+    # .................................................................
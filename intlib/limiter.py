@@ -0,0 +1,149 @@
+# ==== BUILT-IN librariers of Python
+import sys, time, threading
+
+# ==== Constants
+MB                   = 1000 * 1000     # --rate-limit is in MB/s
+PRESSURE_PATH        = "/proc/pressure/io"
+PRESSURE_INTERVAL    = 1.0             # seconds between pressure file reads
+PRESSURE_HIGH        = 20.0            # % of time others waited for I/O over which reading backs off
+PRESSURE_LOW         = 5.0             # % of time others waited for I/O under which reading speeds up
+ADAPTIVE_MIN_FACTOR  = 0.05
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def openLimiter(args):
+    if args.rate_limit or args.device_rate_limit:
+        return IChkRateLimiter(args.rate_limit, args.device_rate_limit, args.rate_burst, args.adaptive_io, args.io_pressure)
+
+    return None
+
+def ioStallTotal(pressurePath=PRESSURE_PATH):
+    # PSI "some total" - microseconds when at least one task of system or cgroup waited for I/O
+    try:
+        with open(pressurePath, 'r') as f:
+            for line in f:
+                if line.startswith("some "):
+                    return int(dict(field.split("=") for field in line.split()[1:])["total"])
+    except (OSError, KeyError, ValueError):
+        pass
+
+    return None
+
+#############################################################################################################
+###### Internal class for providing single token bucket
+#############################################################################################################
+class IChkTokenBucket():
+
+    def __init__(self, rate, burst) -> None:
+        self.rate     = rate
+        self.burst    = burst
+        self.tokens   = burst
+        self.lastTime = time.monotonic()
+
+    def reserve(self, nbytes, factor, now) -> float:
+        rate = self.rate * factor
+
+        self.tokens   = min(self.burst, self.tokens + (now - self.lastTime) * rate)
+        self.lastTime = now
+
+        # reads bigger than bucket go into debt - next reads wait for it
+        self.tokens -= nbytes
+        return -self.tokens / rate if self.tokens < 0 else 0
+
+#############################################################################################################
+###### Internal class for providing rate limit shared by all read paths and threads
+#############################################################################################################
+class IChkRateLimiter():
+
+    def __init__(self, rateLimit=None, deviceRateLimit=None, burst=None, adaptive=False, pressurePath=None) -> None:
+        self.lock          = threading.Lock()
+        self.deviceRate    = deviceRateLimit * MB if deviceRateLimit else None
+        self.burst         = burst * MB if burst else None
+        self.globalBucket  = IChkTokenBucket(rateLimit * MB, self.burstSize(rateLimit * MB)) if rateLimit else None
+        self.devices       = {}
+
+        self.waitTime      = 0
+        self.factor        = 1.0
+        self.adaptive      = adaptive
+        self.pressurePath  = pressurePath or PRESSURE_PATH
+        self.pressureTime  = 0
+        self.stallTotal    = None
+
+        # system wide PSI counts our own read waits too - they are subtracted, otherwise idle disk
+        # would throttle us down to the minimum; cgroup file (--io-pressure) of other workload is used as is
+        self.ownStall      = 0
+        self.subtractOwn   = not pressurePath
+
+        if adaptive and ioStallTotal(self.pressurePath) is None:
+            print(f"WARNING: {self.pressurePath} is not available, adaptive rate limit disabled.", file=sys.stderr)
+            self.adaptive = False
+
+    # .................................................................
+
+    def burstSize(self, rate) -> float:
+        # default burst is quarter of second at full rate
+        return self.burst or rate * 0.25
+
+    def device(self, dev):
+        if dev not in self.devices:
+            self.devices[dev] = IChkTokenBucket(self.deviceRate, self.burstSize(self.deviceRate))
+
+        return self.devices[dev]
+
+    def othersPressure(self, stallTotal, now) -> float:
+        # percent of last interval when other tasks waited for I/O - overlapping waits are counted
+        # once by PSI, so it is underestimated when we and others wait at the same time
+        interval = now - self.pressureTime
+        stall    = (stallTotal - self.stallTotal) / 1000000
+        if self.subtractOwn:
+            stall -= min(self.ownStall, interval)
+
+        return max(0.0, stall) / interval * 100
+
+    def adapt(self, now):
+        if now - self.pressureTime < PRESSURE_INTERVAL:
+            return
+
+        stallTotal = ioStallTotal(self.pressurePath)
+        if stallTotal is None:
+            return
+
+        pressure = self.othersPressure(stallTotal, now) if self.stallTotal is not None else None
+        self.stallTotal   = stallTotal
+        self.ownStall     = 0
+        self.pressureTime = now
+
+        # AIMD - halve rate when other workloads wait for disk, recover slowly
+        if pressure is None:
+            return
+        if pressure > PRESSURE_HIGH:
+            self.factor = max(ADAPTIVE_MIN_FACTOR, self.factor / 2)
+        elif pressure < PRESSURE_LOW:
+            self.factor = min(1.0, self.factor + 0.1)
+
+    # .................................................................
+
+    def acquire(self, nbytes, dev=None, readTime=0):
+        # called from reader threads - sleep happens outside the lock
+        if not nbytes:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            self.ownStall += readTime
+            if self.adaptive:
+                self.adapt(now)
+
+            sleepTime = 0
+            if self.globalBucket:
+                sleepTime = self.globalBucket.reserve(nbytes, self.factor, now)
+            if self.deviceRate and dev is not None:
+                sleepTime = max(sleepTime, self.device(dev).reserve(nbytes, self.factor, now))
+
+            self.waitTime += sleepTime
+
+        if sleepTime > 0:
+            time.sleep(sleepTime)
+
+    # .................................................................
@@ -0,0 +1,130 @@
+# ==== BUILT-IN librariers of Python
+import os, time, json, threading
+from contextlib import nullcontext
+
+# ==== EXTERNAL librariers installed by PyPI
+import trio
+
+# ==== INTERNAL librariers
+from .report import IChkHistogram
+
+# ==== Constants
+METRICS_NAME       = "ichk_phase_seconds"
+METRICS_EXPONENTS  = range(-20, 7)  # Prometheus buckets from 2^-20s (~1us) to 2^6s (64s)
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def openMetrics(args):
+    if args.metrics or args.metrics_prom:
+        return IChkMetrics(args.metrics, args.metrics_prom, args.metrics_interval)
+
+    return nullcontext()
+
+def deviceName(dev) -> str:
+    return f"{os.major(dev)}:{os.minor(dev)}"
+
+def writeAtomic(filePath, text):
+    # textfile collector and readers never see half written file
+    tempPath = f"{filePath}.{os.getpid()}.tmp"
+    with open(tempPath, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tempPath, filePath)
+
+#############################################################################################################
+###### Internal class for timing one phase of file processing - used as context manager
+#############################################################################################################
+class IChkPhaseTimer():
+    __slots__ = ("metrics", "phase", "dev", "startTime")
+
+    def __init__(self, metrics, phase, dev) -> None:
+        self.metrics   = metrics
+        self.phase     = phase
+        self.dev       = dev
+        self.startTime = None
+
+    def __enter__(self):
+        self.startTime = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.metrics.add(self.phase, self.dev, time.perf_counter() - self.startTime)
+
+#############################################################################################################
+###### Internal class for providing latency histograms per phase and device with JSON/Prometheus export
+#############################################################################################################
+class IChkMetrics():
+
+    def __init__(self, jsonPath=None, promPath=None, interval=60) -> None:
+        self.jsonPath   = jsonPath
+        self.promPath   = promPath
+        self.interval   = interval
+        self.startTime  = time.time()
+
+        # phases are timed in worker, reader and tree hash threads
+        self.lock       = threading.Lock()
+        self.histograms = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.export()
+
+    # .................................................................
+
+    def phase(self, phase, dev) -> IChkPhaseTimer:
+        return IChkPhaseTimer(self, phase, dev)
+
+    def add(self, phase, dev, seconds):
+        with self.lock:
+            histogram = self.histograms.get((phase, dev))
+            if histogram is None:
+                histogram = self.histograms[(phase, dev)] = IChkHistogram()
+            histogram.add(seconds)
+
+    # .................................................................
+
+    def snapshot(self) -> dict:
+        phases = {}
+        with self.lock:
+            for (phase, dev), histogram in sorted(self.histograms.items()):
+                phases.setdefault(phase, {})[deviceName(dev)] = histogram.summary() | {"sum": histogram.total}
+
+        return {"time": time.time(), "seconds": round(time.time() - self.startTime, 3), "phases": phases}
+
+    def prometheus(self) -> str:
+        lines = [
+            f"# HELP {METRICS_NAME} Time spent in phases of file processing by ichk.",
+            f"# TYPE {METRICS_NAME} histogram",
+        ]
+
+        with self.lock:
+            for (phase, dev), histogram in sorted(self.histograms.items()):
+                labels = f'phase="{phase}",device="{deviceName(dev)}"'
+                for exponent in METRICS_EXPONENTS:
+                    lines.append(f'{METRICS_NAME}_bucket{{{labels},le="{2.0 ** exponent!r}"}} {histogram.countBelow(exponent)}')
+                lines.append(f'{METRICS_NAME}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'{METRICS_NAME}_sum{{{labels}}} {histogram.total!r}')
+                lines.append(f'{METRICS_NAME}_count{{{labels}}} {histogram.count}')
+
+        lines += [
+            "# HELP ichk_metrics_timestamp_seconds Time of the last metrics export.",
+            "# TYPE ichk_metrics_timestamp_seconds gauge",
+            f"ichk_metrics_timestamp_seconds {time.time():.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        if self.jsonPath:
+            writeAtomic(self.jsonPath, json.dumps(self.snapshot(), indent=2) + "\n")
+        if self.promPath:
+            writeAtomic(self.promPath, self.prometheus())
+
+    async def exporter(self):
+        # long runs are visible in monitoring before they end - final export is done on close
+        while True:
+            await trio.sleep(self.interval)
+            await trio.to_thread.run_sync(self.export)
+
+    # .................................................................
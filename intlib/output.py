@@ -0,0 +1,117 @@
+# ==== BUILT-IN librariers of Python
+import os, sys, json
+from contextlib import nullcontext
+
+# ==== Constants
+OUTPUT_BUFFER_SIZE = 1024 * 1024    # bytes collected before one write to stdout
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def openOutput(args):
+    writers = {"jsonl": IChkJSONLWriter, "csv": IChkCSVWriter, "xxhsum": IChkXXHSumWriter}
+    if args.format in writers:
+        return writers[args.format](not args.no_header)
+
+    return nullcontext()
+
+#############################################################################################################
+###### Internal class for providing buffered binary stdout for machine readable output
+#############################################################################################################
+class IChkOutputWriter():
+
+    def __init__(self, header=True) -> None:
+        self.header = header
+        self.buffer = bytearray()
+        self.stdout = sys.stdout.buffer
+
+    def __enter__(self):
+        if self.header:
+            self.writeHeader()
+
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.flush()
+
+    def flush(self):
+        if self.buffer:
+            # text written by print() before has to go first
+            sys.stdout.flush()
+            self.stdout.write(self.buffer)
+            self.stdout.flush()
+            self.buffer.clear()
+
+    def write(self, line: bytes):
+        self.buffer += line
+        if len(self.buffer) >= OUTPUT_BUFFER_SIZE:
+            self.flush()
+
+    # .................................................................
+
+    def writeHeader(self):
+        pass
+
+    def writeFile(self, fileNo, fileName, xxh128, oshash, fileSize=None, readBps=None, hashBps=None, hashOK=None, digests=None, treeHash=False):
+        pass
+
+#############################################################################################################
+###### Internal class for providing JSON Lines output
+#############################################################################################################
+class IChkJSONLWriter(IChkOutputWriter):
+
+    def writeFile(self, fileNo, fileName, xxh128, oshash, fileSize=None, readBps=None, hashBps=None, hashOK=None, digests=None, treeHash=False):
+        # not UTF-8 file names are kept as surrogate escapes (\udcXX) like os.fsdecode() does
+        self.write(json.dumps({
+            "no": fileNo, "path": fileName, "xxh128": xxh128, "oshash": oshash, "size": fileSize,
+            "read_bps": round(readBps) if readBps else None, "hash_bps": round(hashBps) if hashBps else None,
+            "ok": hashOK
+        } | (digests or {}), separators=(',', ':')).encode() + b"\n")
+
+#############################################################################################################
+###### Internal class for providing CSV output
+#############################################################################################################
+class IChkCSVWriter(IChkOutputWriter):
+
+    def writeHeader(self):
+        self.write(b"no,xxh128,oshash,size,read_bps,hash_bps,ok,path\r\n")
+
+    def writeFile(self, fileNo, fileName, xxh128, oshash, fileSize=None, readBps=None, hashBps=None, hashOK=None, digests=None, treeHash=False):
+        # RFC 4180 - only path can contain separators, quotes or new lines
+        path = os.fsencode(fileName)
+        if any(c in path for c in b',"\r\n'):
+            path = b'"' + path.replace(b'"', b'""') + b'"'
+
+        ok = "" if hashOK is None else ("true" if hashOK else "false")
+        self.write(f"{fileNo},{xxh128 or ''},{oshash or ''},{'' if fileSize is None else fileSize},"
+                   f"{round(readBps) if readBps else ''},{round(hashBps) if hashBps else ''},{ok},".encode() + path + b"\r\n")
+
+#############################################################################################################
+###### Internal class for providing xxhsum compatible checksum file output
+#############################################################################################################
+class IChkXXHSumWriter(IChkOutputWriter):
+
+    def __init__(self, header=True) -> None:
+        super().__init__(header)
+        self.treeSkipped = 0
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        super().__exit__(exception_type, exception_value, exception_traceback)
+        if self.treeSkipped:
+            print(f"WARNING: {self.treeSkipped} files with only tree hash (--tree-hash) skipped - their root isn't XXH128 of the file", file=sys.stderr)
+
+    def writeFile(self, fileNo, fileName, xxh128, oshash, fileSize=None, readBps=None, hashBps=None, hashOK=None, digests=None, treeHash=False):
+        if not xxh128:
+            return
+
+        # xxhsum -c would report every tree hashed file as failed
+        if treeHash:
+            self.treeSkipped += 1
+            return
+
+        # "xxhsum -H2" format, names with new line or backslash are escaped like coreutils do
+        path = os.fsencode(fileName)
+        if b"\\" in path or b"\n" in path:
+            self.write(b"\\" + xxh128.lower().encode() + b"  " + path.replace(b"\\", b"\\\\").replace(b"\n", b"\\n") + b"\n")
+        else:
+            self.write(xxh128.lower().encode() + b"  " + path + b"\n")
@@ -0,0 +1,187 @@
+# ==== BUILT-IN librariers of Python
+import sys, time, json, math
+from contextlib import nullcontext
+
+# ==== INTERNAL librariers
+from .common import HumanBytes
+
+# ==== Constants
+REPORT_BATCH_SIZE    = 256          # rows kept in memory before writing
+REPORT_BATCH_TIME    = 1.0          # max seconds between writes
+HISTOGRAM_SUBBUCKETS = 8            # buckets per power of two - ~9% resolution
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def openReport(args):
+    if args.report or args.cronicle:
+        return IChkReport(args.report, args.cronicle)
+
+    return nullcontext()
+
+#############################################################################################################
+###### Internal class for providing fixed memory histogram with percentiles
+#############################################################################################################
+class IChkHistogram():
+
+    def __init__(self) -> None:
+        self.buckets = {}
+        self.count   = 0
+        self.total   = 0
+        self.min     = None
+        self.max     = None
+
+    def bucket(self, value) -> int:
+        # logarithmic buckets - memory depends on values range, not on values count
+        # floor, not int() - sub-second values have negative logarithm
+        return math.floor(math.log2(value) * HISTOGRAM_SUBBUCKETS) if value > 0 else -sys.maxsize
+
+    def add(self, value):
+        bucket = self.bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min    = value if self.min is None else min(self.min, value)
+        self.max    = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percent):
+        if not self.count:
+            return None
+
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                # upper bound of bucket, but never over real maximum
+                if bucket == -sys.maxsize:
+                    return 0
+                return min(self.max, 2 ** ((bucket + 1) / HISTOGRAM_SUBBUCKETS))
+
+        return self.max
+
+    def countBelow(self, exponent) -> int:
+        # values up to 2^exponent - bucket bounds are aligned to powers of two
+        return sum(count for bucket, count in self.buckets.items() if bucket < exponent * HISTOGRAM_SUBBUCKETS)
+
+    def summary(self, percents=(50, 90, 99)) -> dict:
+        values = {"count": self.count, "min": self.min, "max": self.max,
+                  "mean": self.total / self.count if self.count else None}
+        values |= {f"p{percent}": self.percentile(percent) for percent in percents}
+        return values
+
+#############################################################################################################
+###### Internal class for providing streaming report of processed files with aggregated stats
+#############################################################################################################
+class IChkReport():
+
+    def __init__(self, reportPath=None, cronicle=False) -> None:
+        self.cronicle   = cronicle
+        self.report     = open(reportPath, 'w', encoding='utf-8') if reportPath else None
+        self.batch      = []
+        self.flushTime  = time.time()
+        self.startTime  = time.time()
+
+        self.files      = 0
+        self.bytes      = 0
+        self.verified   = 0
+        self.failed     = 0
+        self.readSpeed  = IChkHistogram()
+        self.hashSpeed  = IChkHistogram()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.close()
+
+    def close(self):
+        summary = self.summary()
+
+        if self.report:
+            self.batch.append(json.dumps({"summary": summary}, separators=(',', ':')))
+            self.flush()
+            self.report.close()
+            self.report = None
+
+        # Cronicle table holds only aggregated stats - files are in --report
+        if self.cronicle:
+            self.printCronicle(summary)
+
+    # .................................................................
+
+    def addFile(self, fileNo, fileName, xxh128, oshash, fileSize=None, readBytes=None, readBps=None, hashBps=None, hashOK=None, digests=None):
+        self.files += 1
+        self.bytes += readBytes or 0
+        if hashOK is not None:
+            self.verified += 1
+        if hashOK is False:
+            self.failed += 1
+        if readBps:
+            self.readSpeed.add(readBps)
+        if hashBps:
+            self.hashSpeed.add(hashBps)
+
+        if self.report:
+            self.batch.append(json.dumps({
+                "no": fileNo, "path": fileName, "xxh128": xxh128, "oshash": oshash,
+                "size": fileSize, "read_bps": readBps, "hash_bps": hashBps, "ok": hashOK
+            } | (digests or {}), separators=(',', ':')))
+
+            if len(self.batch) >= REPORT_BATCH_SIZE or time.time() - self.flushTime >= REPORT_BATCH_TIME:
+                self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.report.write("\n".join(self.batch) + "\n")
+            self.report.flush()
+            self.batch = []
+
+        self.flushTime = time.time()
+
+    # .................................................................
+
+    def summary(self) -> dict:
+        totalTime = time.time() - self.startTime
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "verified": self.verified,
+            "failed": self.failed,
+            "seconds": round(totalTime, 3),
+            "bps": self.bytes / (totalTime or 1),
+            "read_bps": self.readSpeed.summary(),
+            "hash_bps": self.hashSpeed.summary(),
+        }
+
+    def printCronicle(self, summary):
+        def speed(value):
+            return f"{HumanBytes.format(value)}/s" if value else ""
+
+        rows = [
+            ["Files", summary["files"]],
+            ["Read", HumanBytes.format(summary["bytes"])],
+            ["Verified", summary["verified"]],
+            ["Failed", summary["failed"]],
+            ["Time", f"{summary['seconds']:.1f}s"],
+            ["Throughput", speed(summary["bps"])],
+        ]
+        for name, histogram in (("Read speed", summary["read_bps"]), ("Hash speed", summary["hash_bps"])):
+            rows += [[f"{name} p{percent}", speed(histogram[f"p{percent}"])] for percent in (50, 90, 99)]
+
+        cronicleTable = {
+            "table": {
+                "title": "Summary",
+                "header": ["Metric", "Value"],
+                "rows": rows,
+                "caption": "Summary generated by ICHK tool (https://github.com/LukaszBrzyszkiewicz/IntegrityChecker)"
+            }
+        }
+
+        try:
+            print(json.dumps(cronicleTable, separators=(',', ':')))
+        except:
+            print("Internal JSON processing error...")
+            pass
+
+    # .................................................................
@@ -0,0 +1,227 @@
+# ==== BUILT-IN librariers of Python
+import os, sys, math, time, heapq
+
+# ==== EXTERNAL librariers installed by PyPI
+import trio
+
+# ==== INTERNAL librariers
+from .common import SIGINT_handler, HumanBytes
+from .fattr  import IChkFileAttributes
+
+# ==== Constants
+LANES_QUEUE_SIZE = 100000       # max files waiting in all lanes together
+BUDGET_HEAP_SIZE = 100000       # max candidates kept - newer ones are dropped
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def deviceRotational(dev):
+    # /sys/dev/block/<major>:<minor> links to the device or to its partition
+    sysPath = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+
+    try:
+        sysPath = os.path.realpath(sysPath)
+        if os.path.exists(os.path.join(sysPath, "partition")):
+            sysPath = os.path.dirname(sysPath)
+
+        with open(os.path.join(sysPath, "queue", "rotational"), 'r') as f:
+            return f.read().strip() == "1"
+    except OSError:
+        # virtual, network or unknown device (tmpfs, NFS, FUSE...)
+        return None
+
+#############################################################################################################
+###### Internal class for providing per block device hashing lanes
+#############################################################################################################
+class IChkDeviceScheduler():
+
+    def __init__(self, arguments, hasher) -> None:
+        self.arg      = arguments.args
+        self.hasher   = hasher
+        self.hddJobs  = max(1, arguments.args.hdd_jobs)
+        self.ssdJobs  = max(1, arguments.args.ssd_jobs)
+        self.lanes    = {}
+        self.limiter  = None
+
+        # lanes are unbounded, so full lane of slow device never blocks dispatching to others - only total is capped
+        self.queued   = trio.Semaphore(LANES_QUEUE_SIZE)
+
+        # --jobs together with lanes is a global cap for all devices
+        if arguments.args.jobs:
+            self.limiter = trio.CapacityLimiter(arguments.args.jobs)
+
+    # .................................................................
+
+    def laneJobs(self, dev) -> int:
+        # only known SSD gets more readers - btrfs/ZFS anonymous devices or NFS could be spinning disks
+        if dev is not None and deviceRotational(dev) is False:
+            return self.ssdJobs
+
+        return self.hddJobs
+
+    def openLane(self, nursery, dev):
+        sendChannel, receiveChannel = trio.open_memory_channel(math.inf)
+
+        for _ in range(self.laneJobs(dev)):
+            nursery.start_soon(self.worker, receiveChannel.clone())
+
+        receiveChannel.close()
+        self.lanes[dev] = sendChannel
+        return sendChannel
+
+    # .................................................................
+
+    async def worker(self, receiveChannel):
+        async with receiveChannel:
+            async for fileNo, fileName in receiveChannel:
+                self.queued.release()
+                if SIGINT_handler().SIGINT:
+                    return
+
+                if self.limiter:
+                    async with self.limiter:
+                        await self.hasher.calculate(fileNo, fileName)
+                else:
+                    await self.hasher.calculate(fileNo, fileName)
+
+    async def dispatch(self, nursery, receiveChannel):
+        async with receiveChannel:
+            async for fileName, dev in receiveChannel:
+                if SIGINT_handler().SIGINT:
+                    return
+
+                lane = self.lanes.get(dev) or self.openLane(nursery, dev)
+
+                await self.queued.acquire()
+                self.hasher.fileNo += 1
+                try:
+                    lane.send_nowait((self.hasher.fileNo, fileName))
+                except trio.BrokenResourceError:
+                    # lane workers stopped on Ctrl+C
+                    return
+
+    async def traverse(self, receiveChannel):
+        self.hasher.fileNo = 0
+        async with trio.open_nursery() as nursery:
+            try:
+                await self.dispatch(nursery, receiveChannel)
+            finally:
+                for lane in self.lanes.values():
+                    lane.close()
+
+    # .................................................................
+
+
+#############################################################################################################
+###### Internal class for providing time and size budgeted scheduling of the oldest verified files
+#############################################################################################################
+class IChkBudgetScheduler():
+
+    def __init__(self, arguments, progress=None, store=None) -> None:
+        self.arg         = arguments.args
+        self.p           = progress
+        self.store       = store
+        self.startTime   = time.time()
+        self.budgetTime  = arguments.args.budget_time
+        self.budgetBytes = arguments.args.budget_bytes
+        self.candidates  = []
+        self.left        = 0
+        self.sent        = 0
+        self.sentBytes   = 0
+
+        # unbuffered - file is handed over only when worker is free, so budget is checked just before it starts
+        self.sendChannel, self.receiveChannel = trio.open_memory_channel(0)
+
+        self.olderThan   = IChkFileAttributes.olderThanEpoch(self.arg.verify_older_than)
+
+    # .................................................................
+
+    def readCandidate(self, fileName):
+        # open and xattrs read like in the hashing pipeline
+        try:
+            with IChkFileAttributes(fileName, self.store) as fileAttr:
+                return fileAttr.fileSize, fileAttr.readXAttr().get("ichk.updated"), bool(fileAttr.hasChecksumInfo())
+        except OSError:
+            return None
+
+    async def collect(self, fileName, dev):
+        # SQLite connection can't be shared between threads - catalog is read on trio thread
+        if self.store and not self.store.inFile:
+            candidate = self.readCandidate(fileName)
+        else:
+            candidate = await trio.to_thread.run_sync(self.readCandidate, fileName)
+        if candidate is None:
+            return
+
+        fileSize, updated, hasChecksum = candidate
+
+        # --verify-xattr => files without checksum data are skipped by hashing, they can't use the budget
+        if self.arg.verify_xattr and not hasChecksum:
+            self.skip(fileSize, False)
+            return
+
+        # never verified file is the oldest one
+        updatedAt = IChkFileAttributes.updatedEpoch(updated) or 0
+
+        # --verify-older-than => recently verified files are not candidates at all
+        if self.olderThan and updatedAt >= self.olderThan:
+            self.skip(fileSize, False)
+            return
+
+        # heapq is min-heap - negative timestamp keeps the newest candidate on top to be dropped
+        candidate = (-updatedAt, fileName, fileSize, dev)
+        if len(self.candidates) < BUDGET_HEAP_SIZE:
+            heapq.heappush(self.candidates, candidate)
+        else:
+            newest = heapq.heappushpop(self.candidates, candidate)
+            self.skip(newest[2])
+
+    def skip(self, fileSize, left=True):
+        self.left += int(left)
+        if self.p: self.p.reduceTotalSize(fileSize)
+
+    def overBudget(self, sentBytes) -> bool:
+        if self.budgetTime is not None and time.time() - self.startTime >= self.budgetTime:
+            return True
+        if self.budgetBytes is not None and sentBytes >= self.budgetBytes:
+            return True
+
+        return False
+
+    def printSummary(self):
+        if self.left and not self.arg.no_stats:
+            print(f"Budget: {self.sent} files ({HumanBytes.format(self.sentBytes)}) processed, {self.left} files left for next run", file=sys.stderr)
+
+    # .................................................................
+
+    async def traverse(self, receiveChannel):
+
+        async with self.sendChannel:
+            async with receiveChannel:
+                async for fileName, dev in receiveChannel:
+                    if SIGINT_handler().SIGINT:
+                        return
+                    await self.collect(fileName, dev)
+
+            # the oldest first
+            candidates = sorted(self.candidates, key=lambda candidate: (-candidate[0], candidate[1]))
+            self.candidates = []
+
+            for candidateNo, (_, fileName, fileSize, dev) in enumerate(candidates):
+                if SIGINT_handler().SIGINT:
+                    return
+
+                if self.overBudget(self.sentBytes):
+                    for _, _, skippedSize, _ in candidates[candidateNo:]:
+                        self.skip(skippedSize)
+                    break
+
+                try:
+                    await self.sendChannel.send((fileName, dev))
+                except trio.BrokenResourceError:
+                    return
+
+                self.sent      += 1
+                self.sentBytes += fileSize
+
+    # .................................................................
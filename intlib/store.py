@@ -0,0 +1,255 @@
+# ==== BUILT-IN librariers of Python
+import os, time, sqlite3
+
+# ==== Constants
+CATALOG_BATCH_SIZE = 1000       # writes in one transaction
+CATALOG_BATCH_TIME = 1.0        # max seconds between commits
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def openStore(args):
+    if args.catalog:
+        return IChkSQLiteStore(args.catalog)
+
+    return IChkXAttrStore(args.chunk_store)
+
+def packChunks(chunkSize, chunkDigests) -> bytes:
+    return chunkSize.to_bytes(8, 'little') + b"".join(chunkDigests)
+
+def unpackChunks(packed):
+    if not packed or len(packed) < 8:
+        return None
+
+    chunkSize = int.from_bytes(packed[:8], 'little')
+    return chunkSize, [bytes(packed[x : x + 16]) for x in range(8, len(packed), 16)]
+
+#############################################################################################################
+###### Internal class for providing 'user.ichk.*' attributes stored in file extended attributes
+#############################################################################################################
+class IChkXAttrStore():
+    inFile = True               # file has to be unlocked to write attributes
+
+    def __init__(self, chunkStore=None) -> None:
+        # per chunk hashes don't fit into xattr - they are kept in sidecar directory if set
+        self.chunkStore = chunkStore
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.close()
+
+    def close(self):
+        pass
+
+    # .................................................................
+
+    def read(self, fileAttr) -> dict:
+        fileXAttrs = {}
+
+        for xAttrName in fileAttr.xattr.keys():
+            if xAttrName.startswith("user.ichk."):
+                fileXAttrs |= {
+                    xAttrName.removeprefix("user."): fileAttr.xattr[xAttrName].decode()
+                }
+
+        return fileXAttrs
+
+    def write(self, fileAttr, values):
+        for name, value in values.items():
+            fileAttr.xattr["user." + name] = value.encode("ascii")
+
+    def remove(self, fileAttr, names):
+        for name in names:
+            try:
+                del fileAttr.xattr["user." + name]
+            except KeyError:
+                pass
+
+    # .................................................................
+
+    def __chunksPath(self, fileAttr):
+        return os.path.join(self.chunkStore, f"{fileAttr.fileStat.st_dev}-{fileAttr.fileStat.st_ino}.chunks")
+
+    def readChunks(self, fileAttr):
+        if not self.chunkStore:
+            return None
+
+        try:
+            with open(self.__chunksPath(fileAttr), 'rb') as f:
+                return unpackChunks(f.read())
+        except FileNotFoundError:
+            return None
+
+    def writeChunks(self, fileAttr, chunkSize, chunkDigests):
+        if not self.chunkStore:
+            return
+
+        os.makedirs(self.chunkStore, exist_ok=True)
+        chunksPath = self.__chunksPath(fileAttr)
+        with open(chunksPath + ".tmp", 'wb') as f:
+            f.write(packChunks(chunkSize, chunkDigests))
+        os.replace(chunksPath + ".tmp", chunksPath)
+
+    # .................................................................
+
+
+#############################################################################################################
+###### Internal class for providing 'user.ichk.*' attributes stored in SQLite catalog
+#############################################################################################################
+class IChkSQLiteStore():
+    inFile = False
+
+    def __init__(self, catalogPath) -> None:
+        self.catalogPath = catalogPath
+        self.pending     = 0
+        self.commitTime  = time.time()
+
+        self.db = sqlite3.connect(catalogPath)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                id      INTEGER PRIMARY KEY,
+                path    BLOB NOT NULL UNIQUE,
+                dev     INTEGER,
+                ino     INTEGER,
+                updated TEXT
+            );
+            CREATE INDEX IF NOT EXISTS files_inode   ON files (dev, ino);
+            CREATE INDEX IF NOT EXISTS files_updated ON files (updated);
+
+            CREATE TABLE IF NOT EXISTS attrs (
+                file_id INTEGER NOT NULL,
+                name    TEXT NOT NULL,
+                value   TEXT,
+                PRIMARY KEY (file_id, name)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS chunks (
+                file_id INTEGER PRIMARY KEY,
+                digests BLOB
+            );
+        """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.close()
+
+    def close(self):
+        if self.db:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    # .................................................................
+
+    def __path(self, fileName) -> bytes:
+        # paths are stored as bytes - file names don't have to be valid UTF-8
+        return os.fsencode(os.path.abspath(fileName))
+
+    def __fileId(self, fileAttr):
+        row = self.db.execute("SELECT id, updated FROM files WHERE path = ?",
+                              (self.__path(fileAttr.fileName),)).fetchone()
+
+        # file could be renamed or moved since last run - find it by inode and move its entry to the new path
+        if row is None:
+            row = self.__movedFile(fileAttr)
+            if row is not None:
+                self.db.execute("UPDATE files SET path = ? WHERE id = ?", (self.__path(fileAttr.fileName), row[0]))
+                self.pending += 1
+                self.__commit()
+
+        return row or (None, None)
+
+    def __movedFile(self, fileAttr):
+        # inode numbers are reused - entry is taken over only when its old path is gone and stat is the same
+        rows = self.db.execute("SELECT id, updated, path FROM files WHERE dev = ? AND ino = ?",
+                               (fileAttr.fileStat.st_dev, fileAttr.fileStat.st_ino)).fetchall()
+
+        for fileId, updated, path in rows:
+            if os.path.lexists(os.fsdecode(path)):
+                continue
+
+            attrs = dict(self.db.execute("SELECT name, value FROM attrs WHERE file_id = ? AND name IN ('ichk.fsize', 'ichk.mtime')", (fileId,)))
+            if (attrs.get("ichk.fsize") == str(fileAttr.fileStat.st_size) and
+                attrs.get("ichk.mtime") == str(fileAttr.fileStat.st_mtime_ns)):
+                return fileId, updated
+
+        return None
+
+    def __commit(self, force=False):
+        if force or self.pending >= CATALOG_BATCH_SIZE or time.time() - self.commitTime >= CATALOG_BATCH_TIME:
+            self.db.commit()
+            self.pending    = 0
+            self.commitTime = time.time()
+
+    # .................................................................
+
+    def read(self, fileAttr) -> dict:
+        fileId, updated = self.__fileId(fileAttr)
+        if fileId is None:
+            return {}
+
+        fileXAttrs = dict(self.db.execute("SELECT name, value FROM attrs WHERE file_id = ?", (fileId,)))
+        if updated:
+            fileXAttrs["ichk.updated"] = updated
+
+        return fileXAttrs
+
+    def readChunks(self, fileAttr):
+        fileId, _ = self.__fileId(fileAttr)
+        row = self.db.execute("SELECT digests FROM chunks WHERE file_id = ?", (fileId,)).fetchone()
+
+        return unpackChunks(row[0]) if row else None
+
+    def writeChunks(self, fileAttr, chunkSize, chunkDigests):
+        fileId, _ = self.__fileId(fileAttr)
+        if fileId is not None:
+            self.db.execute("INSERT OR REPLACE INTO chunks (file_id, digests) VALUES (?, ?)",
+                            (fileId, packChunks(chunkSize, chunkDigests)))
+
+    def write(self, fileAttr, values):
+        path = self.__path(fileAttr.fileName)
+        self.db.execute("""
+            INSERT INTO files (path, dev, ino, updated) VALUES (?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET dev = excluded.dev, ino = excluded.ino,
+                                             updated = coalesce(excluded.updated, files.updated)
+        """, (path, fileAttr.fileStat.st_dev, fileAttr.fileStat.st_ino, values.get("ichk.updated")))
+
+        fileId = self.db.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()[0]
+        self.db.executemany("INSERT OR REPLACE INTO attrs (file_id, name, value) VALUES (?, ?, ?)",
+                            [(fileId, name, value) for name, value in values.items() if name != "ichk.updated"])
+
+        self.pending += 1
+        self.__commit()
+
+    def remove(self, fileAttr, names):
+        fileId, _ = self.__fileId(fileAttr)
+        if fileId is None:
+            return
+
+        self.db.executemany("DELETE FROM attrs WHERE file_id = ? AND name = ?", [(fileId, name) for name in names])
+        self.pending += 1
+        self.__commit()
+
+    # .................................................................
+
+    def due(self, olderThan=None):
+        # called from walker thread - SQLite connection can't be shared between threads
+        db = sqlite3.connect(self.catalogPath)
+        try:
+            if olderThan:
+                rows = db.execute("SELECT path FROM files WHERE updated < ? ORDER BY updated", (olderThan,))
+            else:
+                rows = db.execute("SELECT path FROM files ORDER BY updated")
+
+            for (path,) in rows:
+                yield os.fsdecode(path)
+        finally:
+            db.close()
+
+    # .................................................................
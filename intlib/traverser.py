@@ -1,73 +1,236 @@
 # ==== BUILT-IN librariers of Python
-import sys, os, glob
-from queue import Queue
+import sys, os, stat, glob, time, hashlib
+from fnmatch import fnmatchcase
 
 # ==== EXTERNAL librariers installed by PyPI
 import trio
 
 # ==== INTERNAL librariers
 from intlib.common    import SIGINT_handler
+from intlib.fattr     import IChkFileAttributes
+from intlib.inodes    import IChkInodeSet
+
+# ==== Constants
+QUEUE_SIZE  = 1024      # max files waiting for hashing
+BATCH_SIZE  = 256       # files passed from walker thread at once
+BATCH_TIME  = 0.1       # max delay of passing walked files
 
 #############################################################################################################
-###### Internal class for providing access to files/directory traversing
+###### Helper functions
 #############################################################################################################
-class IChkGlobTraverser():
+def matchesAny(path, name, patterns) -> bool:
+    for pattern in patterns:
+        # patterns with path separator are matched against whole path, others only against name
+        if fnmatchcase(path if os.sep in pattern else name, pattern):
+            return True
+
+    return False
+
+def linkKey(ino, path) -> int:
+    # hardlinked name as 64-bit hash of inode and absolute path - compact like inode keys
+    return int.from_bytes(hashlib.blake2b(ino.to_bytes(8, 'little') + os.fsencode(os.path.abspath(path)), digest_size=8).digest(), 'little')
 
-    def __init__(self, progress=None) -> None:
-        self.dirsList   = set([])
-        self.filesList  = set([])
-        self.queue      = Queue()
+#############################################################################################################
+###### Internal class for providing access to files/directory traversing
+#############################################################################################################
+class IChkScandirTraverser():
+
+    def __init__(self, arguments, progress=None, store=None) -> None:
+        self.arg        = arguments.args
+        self.store      = store
+        # directories are walked once by (st_dev, st_ino), so walked files are unique without keeping their paths;
+        # files given directly (inputs, globs, stdin) are remembered by inode, hardlinked ones by (dev, hash of inode and path) - other names
+        # of the same inode are still processed (hashed once, see IChkFileHash)
+        self.dirsSeen   = IChkInodeSet()
+        self.filesSeen  = IChkInodeSet()
+        self.linksSeen  = IChkInodeSet()
+        self.batch      = []
+        self.batchTime  = 0
+        self.aborted    = False
+        self.sendChannel, self.receiveChannel = trio.open_memory_channel(QUEUE_SIZE)
         self.p          = progress
+        self.includes   = arguments.args.include or []
+        self.excludes   = arguments.args.exclude or []
 
-    # .................................................................
+        # file size is needed only for total progress
+        self.needSize   = bool(progress and (progress.enabled or progress.cronicle))
 
-    def __traverse(self, inputList, recursive):
-        self.retraverseList = []
-        
-        for inputPattern in inputList:            
-            inputPattern = inputPattern.strip()
-            if not os.path.isfile(inputPattern) and not os.path.isdir(inputPattern):
-                iglob = glob.iglob(inputPattern, recursive=recursive)
-            else:
-                iglob = [inputPattern]
+        self.entries    = 0
+        self.walkTime   = 0
 
-            for iglobFile in iglob:
-                if SIGINT_handler().SIGINT: 
-                    return
+    # .................................................................
 
-                if os.path.isfile(iglobFile):
-                    if iglobFile not in self.filesList:
-                        self.filesList.add(iglobFile)
-                        self.queue.put(iglobFile)
+    async def __sendBatch(self, batch):
+        # (file name, st_dev) - device lanes don't need to stat files again
+        for fileEntry in batch:
+            await self.sendChannel.send(fileEntry)
 
-                        if self.p: self.p.advanceTotalSize(os.path.getsize(iglobFile))
+    def __flush(self):
+        # blocks walker thread when hashing can't keep up - backpressure
+        try:
+            trio.from_thread.run(self.__sendBatch, self.batch)
+        except (trio.BrokenResourceError, trio.ClosedResourceError):
+            self.aborted = True
 
-                elif os.path.isdir(iglobFile) and recursive:
-                    if iglobFile not in self.dirsList:
-                        self.dirsList.add(iglobFile)
-                        self.retraverseList += [os.path.join(iglobFile, '**')]
+        self.batch     = []
+        self.batchTime = time.time()
 
     # .................................................................
 
-    async def traverse(self, inputList, recursive):
-        if inputList is sys.stdin:
-            if not sys.stdin.isatty():
-                inputList = sys.stdin.readlines()
+    def __addFile(self, path, name, size, dev):
+        if self.excludes and matchesAny(path, name, self.excludes):
+            return
+        if self.includes and not matchesAny(path, name, self.includes):
+            return
+
+        self.batch.append((path, dev))
+
+        if self.p and size is not None: self.p.advanceTotalSize(size)
+
+        if len(self.batch) >= BATCH_SIZE or time.time() - self.batchTime >= BATCH_TIME:
+            self.__flush()
+
+    def __walk(self, rootPath, rootDev):
+        dirsStack = [(rootPath, rootDev)]
+
+        while dirsStack:
+            subDirs = []
+
+            dirPath, dirDev = dirsStack.pop()
+            try:
+                dirIterator = os.scandir(dirPath)
+            except OSError:
+                continue
+
+            with dirIterator:
+                for entry in dirIterator:
+                    if SIGINT_handler().SIGINT or self.aborted:
+                        return
+
+                    self.entries += 1
+
+                    # DirEntry type comes from readdir, so only directories, size and device need stat
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.excludes and matchesAny(entry.path, entry.name, self.excludes):
+                                continue
+
+                            entryStat = entry.stat(follow_symlinks=False)
+                            if self.arg.one_file_system and entryStat.st_dev != rootDev:
+                                continue
+
+                            if self.dirsSeen.add((entryStat.st_dev, entryStat.st_ino)):
+                                subDirs.append((entry.path, entryStat.st_dev))
+
+                        elif entry.is_file():
+                            if self.filesSeen and (dirDev, entry.inode()) in self.filesSeen:
+                                continue
+                            if self.linksSeen and (dirDev, linkKey(entry.inode(), entry.path)) in self.linksSeen:
+                                continue
+
+                            # file is on device of its directory - walked directories are already stat-ed
+                            self.__addFile(entry.path, entry.name, entry.stat().st_size if self.needSize else None, dirDev)
+                    except OSError:
+                        continue
+
+            # keep directory order - stack is processed from the end
+            dirsStack.extend(reversed(subDirs))
+
+    def __visit(self, path, recursive, unique=False):
+        try:
+            fileStat = os.stat(path)
+        except OSError:
+            return
+
+        self.entries += 1
+
+        if stat.S_ISREG(fileStat.st_mode):
+            # file inside already walked directory was sent by walk
+            if unique or not (self.dirsSeen and self.__inWalkedDir(path)):
+                if unique or self.__firstVisit(path, fileStat):
+                    self.__addFile(path, os.path.basename(path), fileStat.st_size, fileStat.st_dev)
+
+        elif stat.S_ISDIR(fileStat.st_mode) and recursive:
+            if self.dirsSeen.add((fileStat.st_dev, fileStat.st_ino)):
+                self.__walk(path, fileStat.st_dev)
+
+    def __firstVisit(self, path, fileStat) -> bool:
+        if fileStat.st_nlink > 1:
+            return self.linksSeen.add((fileStat.st_dev, linkKey(fileStat.st_ino, path)))
+
+        return self.filesSeen.add((fileStat.st_dev, fileStat.st_ino))
+
+    def __inWalkedDir(self, path) -> bool:
+        try:
+            dirStat = os.stat(os.path.dirname(os.path.abspath(path)))
+        except OSError:
+            return False
+
+        return (dirStat.st_dev, dirStat.st_ino) in self.dirsSeen
+
+    def __traverseCatalog(self, inputList):
+        # one indexed query instead of reading xattrs of every file in the tree
+        olderThan = IChkFileAttributes.olderThanEpoch(self.arg.verify_older_than)
+        olderThan = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(olderThan)) if olderThan else None
+        prefixes  = set(os.path.abspath(inputPath.strip()) for inputPath in inputList)
+        dirs      = tuple(prefix.rstrip(os.sep) + os.sep for prefix in prefixes)
+
+        for fileName in self.store.due(olderThan):
+            if SIGINT_handler().SIGINT or self.aborted:
+                break
+
+            if not prefixes or fileName in prefixes or fileName.startswith(dirs):
+                # catalog paths are unique
+                self.__visit(fileName, False, True)
+
+    def __traverseInput(self, inputList, recursive):
+        for inputPattern in inputList:
+            inputPattern = inputPattern.strip()
+            if os.path.lexists(inputPattern):
+                iglob = [inputPattern]
             else:
-                self.queue.put("**END**")
-                return
+                iglob = glob.iglob(inputPattern, recursive=recursive)
 
-        if not SIGINT_handler().SIGINT: 
-            await trio.to_thread.run_sync(self.__traverse, inputList, recursive)
+            for iglobFile in iglob:
+                if SIGINT_handler().SIGINT or self.aborted:
+                    break
 
-        if not SIGINT_handler().SIGINT: 
-            await trio.to_thread.run_sync(self.__traverse, self.retraverseList, recursive)
+                self.__visit(iglobFile, recursive)
 
-        self.queue.put("**END**")
-        self.retraverseList = None
+    def __traverse(self, inputList, recursive):
+        walkStartTime  = time.time()
+        self.batchTime = walkStartTime
+
+        if self.store and self.arg.catalog_due:
+            self.__traverseCatalog(inputList)
+        else:
+            self.__traverseInput(inputList, recursive)
+
+        if self.batch and not SIGINT_handler().SIGINT and not self.aborted:
+            self.__flush()
+
+        self.walkTime = time.time() - walkStartTime
 
     # .................................................................
 
+    def printWalkStats(self):
+        if self.arg.progress and not self.arg.no_stats:
+            entriesPerSec = self.entries / (self.walkTime or 1)
+            print(f"Walked {self.entries} entries in {self.walkTime:.1f}s ({entriesPerSec:.0f} entries/s)", file=sys.stderr)
 
+    async def traverse(self, inputList, recursive):
+        # closing send channel is end of stream for hashing workers
+        async with self.sendChannel:
+            if inputList is sys.stdin:
+                if not sys.stdin.isatty():
+                    inputList = sys.stdin.readlines()
+                elif self.arg.catalog_due:
+                    inputList = []
+                else:
+                    return
 
+            if not SIGINT_handler().SIGINT:
+                await trio.to_thread.run_sync(self.__traverse, inputList, recursive)
+                self.printWalkStats()
 
+    # .................................................................
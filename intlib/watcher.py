@@ -0,0 +1,270 @@
+# ==== BUILT-IN librariers of Python
+import sys, os, stat, time, errno, struct, ctypes, ctypes.util
+
+# ==== EXTERNAL librariers installed by PyPI
+import trio
+
+# ==== INTERNAL librariers
+from intlib.common    import SIGINT_handler
+from intlib.traverser import matchesAny
+
+# ==== Constants
+QUEUE_SIZE       = 1024         # max files waiting for hashing
+WATCH_POLL_TIME  = 0.5          # max delay of noticing Ctrl+C and due files
+EVENT_BUFFER     = 64 * 1024    # bytes read from inotify descriptor at once
+EVENT_HEADER     = struct.Struct("iIII")
+
+IN_CLOSE_WRITE   = 0x00000008
+IN_MOVED_TO      = 0x00000080
+IN_CREATE        = 0x00000100
+IN_DELETE_SELF   = 0x00000400
+IN_MOVE_SELF     = 0x00000800
+IN_Q_OVERFLOW    = 0x00004000
+IN_IGNORED       = 0x00008000
+IN_ONLYDIR       = 0x01000000
+IN_DONT_FOLLOW   = 0x02000000
+IN_ISDIR         = 0x40000000
+IN_NONBLOCK      = os.O_NONBLOCK
+IN_CLOEXEC       = os.O_CLOEXEC
+
+# files are reported when writer closes them or when they are moved in, new directories are watched too
+WATCH_MASK       = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW
+
+#############################################################################################################
+###### Internal class for providing files completed in watched directories (inotify, Linux only)
+#############################################################################################################
+class IChkInotifyWatcher():
+
+    def __init__(self, arguments, progress=None) -> None:
+        self.arg        = arguments.args
+        self.p          = progress
+        self.includes   = arguments.args.include or []
+        self.excludes   = arguments.args.exclude or []
+        self.debounce   = arguments.args.watch_debounce
+        self.rescan     = arguments.args.watch_rescan
+        self.sendChannel, self.receiveChannel = trio.open_memory_channel(QUEUE_SIZE)
+
+        self.libc       = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd         = None
+        self.watches    = {}        # wd => directory path
+        self.unwatched  = set([])   # directories over inotify watch limit - they are rescanned
+        self.limitHit   = False
+        self.pending    = {}        # path => time when file is quiet long enough to be hashed
+        self.rescanTime = time.time()
+
+        self.events     = 0
+        self.files      = 0
+
+    # .................................................................
+
+    def __addWatch(self, dirPath):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirPath), WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = dirPath
+            return True
+
+        error = ctypes.get_errno()
+        if error != errno.ENOSPC:
+            # directory removed meanwhile, no permissions...
+            return False
+
+        # fs.inotify.max_user_watches reached - directory is still covered by periodic rescan
+        if not self.limitHit:
+            self.limitHit = True
+            print(f"WARNING: inotify watch limit reached ({len(self.watches)} directories watched), other directories are rescanned "
+                  f"every {self.rescan:.0f}s - raise fs.inotify.max_user_watches to watch them all", file=sys.stderr)
+        self.unwatched.add(dirPath)
+        return False
+
+    def __watchTree(self, rootPath, recursive, queueFiles=False):
+        # only directories are walked - files are reported by events
+        try:
+            rootDev = os.stat(rootPath).st_dev
+        except OSError:
+            # temporary directory (rsync, ingest...) removed before its event was read
+            return
+        dirsStack = [rootPath]
+
+        while dirsStack:
+            dirPath = dirsStack.pop()
+            if not self.__addWatch(dirPath) and dirPath not in self.unwatched:
+                # directory removed meanwhile - nothing to walk
+                continue
+
+            if not recursive and not queueFiles:
+                continue
+
+            try:
+                with os.scandir(dirPath) as dirIterator:
+                    for entry in dirIterator:
+                        try:
+                            if entry.is_dir(follow_symlinks=False) and recursive:
+                                if self.excludes and matchesAny(entry.path, entry.name, self.excludes):
+                                    continue
+                                if self.arg.one_file_system and entry.stat(follow_symlinks=False).st_dev != rootDev:
+                                    continue
+                                dirsStack.append(entry.path)
+
+                            # directory created or moved in - files written before its watch was added
+                            elif queueFiles and entry.is_file(follow_symlinks=False):
+                                self.__queueFile(entry.path)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    # .................................................................
+
+    def __queueFile(self, path):
+        name = os.path.basename(path)
+        if self.excludes and matchesAny(path, name, self.excludes):
+            return
+        if self.includes and not matchesAny(path, name, self.includes):
+            return
+
+        # every next event of the same file postpones it - file is hashed once it is quiet
+        self.pending[path] = time.monotonic() + self.debounce
+
+    def __rescanUnwatched(self, since):
+        # watches could be freed meanwhile - watched directory doesn't need rescan anymore
+        for dirPath in list(self.unwatched):
+            if self.__addWatch(dirPath):
+                self.unwatched.discard(dirPath)
+
+        self.__rescanDirs(list(self.unwatched), since)
+
+    def __rescanDirs(self, dirPaths, since):
+        for dirPath in dirPaths:
+            try:
+                with os.scandir(dirPath) as dirIterator:
+                    for entry in dirIterator:
+                        if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime >= since:
+                            self.__queueFile(entry.path)
+
+                        # directory created or changed since last rescan - it is watched or rescanned from now on
+                        elif (self.arg.recursive and entry.is_dir(follow_symlinks=False) and
+                              entry.stat(follow_symlinks=False).st_ctime >= since and
+                              not (self.excludes and matchesAny(entry.path, entry.name, self.excludes))):
+                            self.__watchTree(entry.path, True, True)
+            except OSError:
+                continue
+
+    async def __handleEvent(self, wd, mask, name):
+        self.events += 1
+
+        if mask & IN_IGNORED:
+            self.watches.pop(wd, None)
+            return
+
+        dirPath = self.watches.get(wd)
+        if dirPath is None or not name:
+            return
+
+        path = os.path.join(dirPath, name)
+        if mask & IN_ISDIR:
+            # new directory is watched like the rest of tree, its files are queued - moved in tree could be large
+            if mask & (IN_CREATE | IN_MOVED_TO) and self.arg.recursive:
+                if not (self.excludes and matchesAny(path, name, self.excludes)):
+                    await trio.to_thread.run_sync(self.__watchTree, path, True, True)
+            return
+
+        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            self.__queueFile(path)
+
+    async def __readEvents(self, lastRead):
+        try:
+            data = os.read(self.fd, EVENT_BUFFER)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, nameLen = EVENT_HEADER.unpack_from(data, offset)
+            name    = os.fsdecode(data[offset + EVENT_HEADER.size : offset + EVENT_HEADER.size + nameLen].rstrip(b"\0"))
+            offset += EVENT_HEADER.size + nameLen
+
+            # kernel queue was full - events since the last read are lost
+            if mask & IN_Q_OVERFLOW:
+                print("WARNING: inotify event queue overflowed, rescanning watched directories", file=sys.stderr)
+                await trio.to_thread.run_sync(self.__rescanDirs, list(self.watches.values()) + list(self.unwatched), lastRead - self.debounce)
+                continue
+
+            await self.__handleEvent(wd, mask, name)
+
+    # .................................................................
+
+    async def __sendDue(self):
+        now = time.monotonic()
+        for path in [path for path, dueTime in self.pending.items() if dueTime <= now]:
+            del self.pending[path]
+
+            # file could be removed or replaced by something else meanwhile
+            try:
+                fileStat = os.stat(path, follow_symlinks=False)
+            except OSError:
+                continue
+            if not stat.S_ISREG(fileStat.st_mode):
+                continue
+
+            if self.p: self.p.advanceTotalSize(fileStat.st_size)
+            self.files += 1
+            await self.sendChannel.send((path, fileStat.st_dev))
+
+    async def __watch(self):
+        lastRead = time.time()
+
+        while not SIGINT_handler().SIGINT:
+            readable = False
+            with trio.move_on_after(WATCH_POLL_TIME):
+                await trio.lowlevel.wait_readable(self.fd)
+                readable = True
+
+            # out of timeout scope - directory walks in threads must not lose the rest of read events
+            if readable:
+                readTime = time.time()
+                await self.__readEvents(lastRead)
+                lastRead = readTime
+
+            # directories over watch limit are checked by mtime
+            if self.unwatched and time.time() - self.rescanTime >= self.rescan:
+                rescanStart = time.time()
+                await trio.to_thread.run_sync(self.__rescanUnwatched, self.rescanTime - self.debounce)
+                self.rescanTime = rescanStart
+
+            try:
+                await self.__sendDue()
+            except (trio.BrokenResourceError, trio.ClosedResourceError):
+                return
+
+    # .................................................................
+
+    def printWatchStats(self):
+        if not self.arg.no_stats:
+            print(f"Watched {len(self.watches)} directories ({len(self.unwatched)} rescanned), {self.events} events, "
+                  f"{self.files} files queued, {len(self.pending)} files left not hashed", file=sys.stderr)
+
+    async def traverse(self, inputList, recursive):
+        # closing send channel is end of stream for hashing workers
+        async with self.sendChannel:
+            self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if self.fd < 0:
+                print(f"ERROR: inotify is not available: {os.strerror(ctypes.get_errno())}", file=sys.stderr)
+                return
+
+            try:
+                for inputPath in inputList:
+                    inputPath = inputPath.strip()
+                    if os.path.isdir(inputPath):
+                        await trio.to_thread.run_sync(self.__watchTree, inputPath, recursive)
+                    else:
+                        print(f"WARNING: only directories can be watched, skipping {inputPath}", file=sys.stderr)
+
+                self.rescanTime = time.time()
+                await self.__watch()
+            finally:
+                os.close(self.fd)
+                self.fd = None
+
+            self.printWatchStats()
+
+    # .................................................................
@@ -0,0 +1,5 @@
+# ==== BUILT-IN librariers of Python
+import os, sys
+
+# tests import intlib the same way ichk.py does - from repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
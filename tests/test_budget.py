@@ -0,0 +1,33 @@
+# ==== BUILT-IN librariers of Python
+import os, sys, csv, subprocess
+
+# ==== EXTERNAL librariers installed by PyPI
+import pytest
+
+# ==== Constants
+ICHK      = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ichk.py")
+FILE_SIZE = 300000
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def ichk(cwd, *arguments):
+    result = subprocess.run([sys.executable, ICHK, "--format", "csv", *arguments],
+                            cwd=cwd, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return list(csv.DictReader(result.stdout.splitlines()))
+
+#############################################################################################################
+###### Tests
+#############################################################################################################
+@pytest.mark.parametrize("budget", [["--budget-bytes", "400K"], ["--budget-time", "60"]])
+def test_budget_with_catalog(tmp_path, budget):
+    os.makedirs(tmp_path / "t1" / "a")
+    for fileNo in range(3):
+        (tmp_path / "t1" / "a" / f"f{fileNo}").write_bytes(os.urandom(FILE_SIZE))
+
+    assert len(ichk(tmp_path, "-r", "-c", "-s", "--catalog", "cat.db", "t1")) == 3
+
+    rows = ichk(tmp_path, "-r", "-v", "--catalog", "cat.db", *budget, "t1")
+    assert len(rows) == (2 if budget[0] == "--budget-bytes" else 3)
+    assert all(row["ok"] == "true" for row in rows)
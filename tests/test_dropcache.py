@@ -0,0 +1,104 @@
+# ==== BUILT-IN librariers of Python
+import os, mmap, ctypes, ctypes.util
+
+# ==== EXTERNAL librariers installed by PyPI
+import pytest
+import trio
+
+# ==== INTERNAL librariers
+from intlib.engine import IChkHashEngine, fadvise
+from intlib.hash   import IChkFileHashProgress
+
+# ==== Constants
+FILE_SIZE = 16 * 1024 * 1024
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="posix_fadvise is not available")
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def residentPages(fileName) -> int:
+    # mincore on a mapping which is never touched - mapping doesn't fault pages in
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    libc.mmap.restype  = ctypes.c_void_p
+    libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+    libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p]
+    libc.munmap.argtypes  = [ctypes.c_void_p, ctypes.c_size_t]
+
+    fileSize = os.path.getsize(fileName)
+    pages    = -(-fileSize // mmap.PAGESIZE)
+    vector   = ctypes.create_string_buffer(pages)
+
+    fd = os.open(fileName, os.O_RDONLY)
+    try:
+        address = libc.mmap(None, fileSize, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+        if address in (None, ctypes.c_void_p(-1).value):
+            pytest.skip(f"mmap failed: {os.strerror(ctypes.get_errno())}")
+        try:
+            if libc.mincore(address, fileSize, vector) != 0:
+                pytest.skip(f"mincore failed: {os.strerror(ctypes.get_errno())}")
+        finally:
+            libc.munmap(address, fileSize)
+    finally:
+        os.close(fd)
+
+    return sum(page & 1 for page in vector.raw)
+
+def cachedFile(tmp_path):
+    fileName = str(tmp_path / "file.bin")
+    with open(fileName, 'wb') as f:
+        f.write(os.urandom(FILE_SIZE))
+        os.fsync(f.fileno())
+
+    # read once - whole file is in page cache before hashing
+    with open(fileName, 'rb') as f:
+        while f.read(1024 * 1024):
+            pass
+
+    return fileName
+
+#############################################################################################################
+###### Tests
+#############################################################################################################
+def test_drop_cache_leaves_file_out_of_page_cache(tmp_path):
+    fileName = cachedFile(tmp_path)
+    pages    = -(-FILE_SIZE // mmap.PAGESIZE)
+    if residentPages(fileName) < pages * 0.9:
+        pytest.skip("file isn't kept in page cache after read")
+
+    # tmpfs and similar file systems can't drop their pages
+    fd = os.open(fileName, os.O_RDONLY)
+    try:
+        fadvise(fd, 0, FILE_SIZE, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    if residentPages(fileName) >= pages * 0.9:
+        pytest.skip("file system ignores POSIX_FADV_DONTNEED")
+    fileName = cachedFile(tmp_path)
+
+    engine = IChkHashEngine(IChkFileHashProgress(False, False), dropCache=True)
+    fd = os.open(fileName, os.O_RDONLY)
+    try:
+        result = trio.run(engine.hashFile, fd, FILE_SIZE)
+    finally:
+        os.close(fd)
+
+    assert result[0] is not None
+    assert engine.droppedBytes >= FILE_SIZE
+    assert residentPages(fileName) < pages * 0.1
+
+def test_without_drop_cache_file_stays_cached(tmp_path):
+    fileName = cachedFile(tmp_path)
+    pages    = -(-FILE_SIZE // mmap.PAGESIZE)
+    if residentPages(fileName) < pages * 0.9:
+        pytest.skip("file isn't kept in page cache after read")
+
+    engine = IChkHashEngine(IChkFileHashProgress(False, False))
+    fd = os.open(fileName, os.O_RDONLY)
+    try:
+        trio.run(engine.hashFile, fd, FILE_SIZE)
+    finally:
+        os.close(fd)
+
+    assert engine.droppedBytes == 0
+    assert residentPages(fileName) >= pages * 0.9
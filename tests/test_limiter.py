@@ -0,0 +1,83 @@
+# ==== BUILT-IN librariers of Python
+import time, threading
+
+# ==== EXTERNAL librariers installed by PyPI
+import pytest
+
+# ==== INTERNAL librariers
+from intlib import limiter
+from intlib.limiter import IChkRateLimiter, MB
+
+# ==== Constants
+RATE_LIMIT = 50         # MB/s
+READ_SIZE  = 64 * 1024
+DURATION   = 1.0
+
+#############################################################################################################
+###### Tests
+#############################################################################################################
+@pytest.mark.parametrize("threads", [1, 4])
+def test_throughput_stays_at_rate_limit(threads):
+    rateLimiter = IChkRateLimiter(RATE_LIMIT)
+    readBytes   = [0] * threads
+
+    def reader(threadNo):
+        while time.monotonic() - startTime < DURATION:
+            rateLimiter.acquire(READ_SIZE, 1)
+            readBytes[threadNo] += READ_SIZE
+
+    startTime = time.monotonic()
+    workers   = [threading.Thread(target=reader, args=(threadNo,)) for threadNo in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    totalTime = time.monotonic() - startTime
+
+    # full bucket at start is burst over the rate
+    rate = (sum(readBytes) - rateLimiter.burstSize(RATE_LIMIT * MB)) / totalTime
+    assert rate == pytest.approx(RATE_LIMIT * MB, rel=0.05)
+
+def test_device_rate_limit_is_per_device():
+    rateLimiter = IChkRateLimiter(deviceRateLimit=RATE_LIMIT)
+
+    # other device has its own full bucket
+    rateLimiter.acquire(int(rateLimiter.burstSize(RATE_LIMIT * MB)), 1)
+    startTime = time.monotonic()
+    rateLimiter.acquire(READ_SIZE, 2)
+    assert time.monotonic() - startTime < 0.01
+
+def test_adaptive_ignores_own_read_waits(tmp_path, monkeypatch):
+    pressureFile = tmp_path / "io"
+    monkeypatch.setattr(limiter, "PRESSURE_PATH", str(pressureFile))
+
+    def stall(total):
+        pressureFile.write_text(f"some avg10=0.00 avg60=0.00 avg300=0.00 total={total}\n"
+                                f"full avg10=0.00 avg60=0.00 avg300=0.00 total={total}\n")
+
+    stall(0)
+    rateLimiter = IChkRateLimiter(RATE_LIMIT, adaptive=True)
+    rateLimiter.adapt(100.0)
+
+    # whole second of I/O wait, all of it by our own reads => idle disk, no back off
+    stall(1000000)
+    rateLimiter.ownStall = 1.0
+    rateLimiter.adapt(101.0)
+    assert rateLimiter.factor == 1.0
+
+    # the same wait without our reads => other workload, rate is halved
+    stall(2000000)
+    rateLimiter.adapt(102.0)
+    assert rateLimiter.factor == 0.5
+
+def test_adaptive_cgroup_pressure_is_used_as_is(tmp_path):
+    pressureFile = tmp_path / "io.pressure"
+    pressureFile.write_text("some avg10=0.00 avg60=0.00 avg300=0.00 total=0\n")
+
+    rateLimiter = IChkRateLimiter(RATE_LIMIT, adaptive=True, pressurePath=str(pressureFile))
+    rateLimiter.adapt(100.0)
+
+    pressureFile.write_text("some avg10=0.00 avg60=0.00 avg300=0.00 total=500000\n")
+    rateLimiter.ownStall = 1.0
+    rateLimiter.adapt(101.0)
+    assert rateLimiter.factor == 0.5
@@ -0,0 +1,66 @@
+# ==== BUILT-IN librariers of Python
+import os
+
+# ==== EXTERNAL librariers installed by PyPI
+import pytest
+
+# ==== INTERNAL librariers
+from intlib.args  import IChkArgumentParser
+from intlib.fattr import IChkFileAttributes
+from intlib.hash  import IChkFileHash
+
+#############################################################################################################
+###### Reference implementation - OSHASH summation before it was done on uint64 words in bulk
+#############################################################################################################
+def sumBytesLoop(bytesView):
+    bsum = 0
+    sz = len(bytesView) // 8
+    for x in range(sz):
+        bsum = (bsum + int.from_bytes(bytesView[8*x : 8*(x+1)], byteorder='little', signed=False)) & 0xFFFFFFFFFFFFFFFF
+
+    return bsum
+
+def oshashLoop(fileName):
+    fs = os.path.getsize(fileName)
+    if fs <= 8:
+        return f"{0:016X}"
+
+    chunkSize = 64 * 1024
+    if fs < chunkSize:
+        chunkSize = int((fs // 8) * 8)
+
+    with open(fileName, 'rb') as f:
+        head = f.read(chunkSize)
+        f.seek(-chunkSize, os.SEEK_END)
+        tail = f.read(chunkSize)
+
+    oshash = (sumBytesLoop(memoryview(head)) + sumBytesLoop(memoryview(tail)) + fs) & 0xFFFFFFFFFFFFFFFF
+    return f"{oshash:016X}"
+
+#############################################################################################################
+###### Tests
+#############################################################################################################
+def sumBytes(buffer):
+    # method doesn't use instance state
+    return IChkFileHash._IChkFileHash__sumBytes(None, memoryview(buffer))
+
+@pytest.mark.parametrize("buffer", [
+    os.urandom(8),
+    os.urandom(8 * 1000),
+    os.urandom(64 * 1024),
+    b"\xFF" * 64 * 1024,
+], ids=["8B", "sub-64KiB", "64KiB", "all-0xFF"])
+def test_sum_bytes_matches_loop(buffer):
+    assert sumBytes(buffer) == sumBytesLoop(memoryview(buffer))
+
+@pytest.mark.parametrize("fileSize", [5, 8, 9, 1000, 64 * 1024, 64 * 1024 + 7, 3 * 1024 * 1024])
+def test_oshash_matches_loop(tmp_path, fileSize):
+    fileName = tmp_path / "file.bin"
+    fileName.write_bytes(os.urandom(fileSize))
+
+    arguments = IChkArgumentParser(["--format", "jsonl", str(fileName)])
+    hasher    = IChkFileHash(arguments, None, output=True)
+    with IChkFileAttributes(str(fileName)) as fileAttr:
+        oshash, _ = hasher._IChkFileHash__oshash(fileAttr)
+
+    assert oshash == oshashLoop(fileName)
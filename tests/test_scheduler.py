@@ -0,0 +1,18 @@
+# ==== BUILT-IN librariers of Python
+import os
+
+# ==== INTERNAL librariers
+from intlib.args      import IChkArgumentParser
+from intlib.scheduler import IChkDeviceScheduler, deviceRotational
+
+#############################################################################################################
+###### Tests
+#############################################################################################################
+def test_unknown_device_gets_hdd_jobs():
+    scheduler = IChkDeviceScheduler(IChkArgumentParser(["--device-lanes", "--hdd-jobs", "2", "--ssd-jobs", "8", "x"]), None)
+
+    # anonymous device (btrfs/ZFS subvolume, NFS...) has no /sys/dev/block entry
+    anonymousDev = os.makedev(0, 0xFFFFF)
+    assert deviceRotational(anonymousDev) is None
+    assert scheduler.laneJobs(anonymousDev) == 2
+    assert scheduler.laneJobs(None) == 2
@@ -0,0 +1,95 @@
+# ==== BUILT-IN librariers of Python
+import os
+
+# ==== EXTERNAL librariers installed by PyPI
+import pytest
+
+# ==== INTERNAL librariers
+from intlib.fattr import IChkFileAttributes
+from intlib.store import IChkSQLiteStore, IChkXAttrStore
+
+#############################################################################################################
+###### Helper functions
+#############################################################################################################
+def openTestStore(tmp_path, storeType):
+    if storeType == "catalog":
+        return IChkSQLiteStore(str(tmp_path / "cat.db"))
+
+    return IChkXAttrStore(str(tmp_path / "chunks"))
+
+def writeHash(fileName, store, treeHash):
+    with IChkFileAttributes(fileName, store) as fileAttr:
+        fileAttr.readXAttr()
+        if treeHash:
+            fileAttr.writeXAttr("T" * 32, "B" * 16, 1024 * 1024, [b"C" * 16])
+        else:
+            fileAttr.writeXAttr("A" * 32, "B" * 16)
+
+def readHash(fileName, store):
+    with IChkFileAttributes(fileName, store) as fileAttr:
+        return {name: value for name, value in fileAttr.readXAttr().items() if name.startswith("ichk.xxh128") or name == "ichk.chunksize"}
+
+#############################################################################################################
+###### Tests
+#############################################################################################################
+def test_moved_file_entry_is_moved_to_new_path(tmp_path):
+    oldName = str(tmp_path / "x")
+    newName = str(tmp_path / "y")
+    with open(oldName, 'wb') as f:
+        f.write(os.urandom(4096))
+
+    with IChkSQLiteStore(str(tmp_path / "cat.db")) as store:
+        with IChkFileAttributes(oldName, store) as fileAttr:
+            fileAttr.writeXAttr("A" * 32, "B" * 16)
+
+        os.rename(oldName, newName)
+        with IChkFileAttributes(newName, store) as fileAttr:
+            assert fileAttr.readXAttr().get("ichk.xxh128") == "A" * 32
+            fileAttr.writeScrub(1, 3, 4096)
+
+        # next run finds checksum info under new path, old path is gone
+        with IChkFileAttributes(newName, store) as fileAttr:
+            assert fileAttr.hasChecksumInfo()
+            assert fileAttr.readXAttr().get("ichk.scrub") == "1/3"
+
+    # due() reads committed catalog on its own connection
+    assert list(store.due()) == [newName]
+
+@pytest.mark.parametrize("storeType", ["xattr", "catalog"])
+def test_hash_of_other_mode_is_removed(tmp_path, storeType):
+    fileName = str(tmp_path / "x")
+    with open(fileName, 'wb') as f:
+        f.write(os.urandom(4096))
+
+    with openTestStore(tmp_path, storeType) as store:
+        writeHash(fileName, store, False)
+        writeHash(fileName, store, True)
+        assert readHash(fileName, store) == {"ichk.xxh128tree": "T" * 32, "ichk.chunksize": str(1024 * 1024)}
+
+        writeHash(fileName, store, False)
+        assert readHash(fileName, store) == {"ichk.xxh128": "A" * 32}
+
+@pytest.mark.parametrize("storeType", ["xattr", "catalog"])
+def test_digests_not_calculated_again_are_removed(tmp_path, storeType):
+    fileName = str(tmp_path / "x")
+    with open(fileName, 'wb') as f:
+        f.write(os.urandom(4096))
+
+    with openTestStore(tmp_path, storeType) as store:
+        with IChkFileAttributes(fileName, store) as fileAttr:
+            fileAttr.writeXAttr("A" * 32, "B" * 16, digests={"sha256": "D" * 64, "blake2b": "E" * 128})
+
+        # file changed and hashed again with sha256 only
+        with IChkFileAttributes(fileName, store) as fileAttr:
+            fileAttr.readXAttr()
+            fileAttr.writeXAttr("F" * 32, "B" * 16, digests={"sha256": "G" * 64})
+
+        with IChkFileAttributes(fileName, store) as fileAttr:
+            assert fileAttr.storedDigests(["sha256", "blake2b", "xxh3_64"]) == {"sha256": "G" * 64}
+
+        # without --digest no old digest is left
+        with IChkFileAttributes(fileName, store) as fileAttr:
+            fileAttr.writeXAttr("H" * 32, "B" * 16)
+
+        with IChkFileAttributes(fileName, store) as fileAttr:
+            assert fileAttr.storedDigests(["sha256", "blake2b", "xxh3_64"]) == {}
@@ -0,0 +1,52 @@
+# ==== BUILT-IN librariers of Python
+import os, time, errno
+
+# ==== EXTERNAL librariers installed by PyPI
+import pytest
+import trio
+
+# ==== INTERNAL librariers
+from intlib.engine import IChkHashEngine
+from intlib.hash   import IChkFileHashProgress
+
+# ==== Constants
+MIB        = 1024 * 1024
+CHUNK_SIZE = MIB
+FILE_SIZE  = 8 * MIB
+
+#############################################################################################################
+###### Tests
+#############################################################################################################
+def test_failed_chunk_stops_other_chunks_reads(tmp_path, monkeypatch):
+    fileName = str(tmp_path / "file.bin")
+    with open(fileName, 'wb') as f:
+        f.write(os.urandom(FILE_SIZE))
+
+    readTimes = []
+    preadv    = os.preadv
+
+    def failingPreadv(fd, buffers, offset):
+        # first chunk fails at once, others are slow enough to still run when it fails
+        if offset == 0:
+            raise OSError(errno.EIO, os.strerror(errno.EIO))
+        time.sleep(0.01)
+        readTimes.append(time.monotonic())
+        return preadv(fd, buffers, offset)
+
+    monkeypatch.setattr(os, "preadv", failingPreadv)
+
+    engine = IChkHashEngine(IChkFileHashProgress(False, False), bufferSize=0.25, treeThreads=2)
+    fd = os.open(fileName, os.O_RDONLY)
+    try:
+        with pytest.raises(OSError):
+            trio.run(engine.hashTree, fd, FILE_SIZE, CHUNK_SIZE)
+        failedTime = time.monotonic()
+    finally:
+        os.close(fd)
+
+    # descriptor is closed right after failure - nothing may read it anymore
+    time.sleep(0.1)
+    assert readTimes and max(readTimes) <= failedTime
+
+    # queued chunks are cancelled - the rest of file is not read
+    assert len(readTimes) * MIB // 4 < FILE_SIZE - CHUNK_SIZE